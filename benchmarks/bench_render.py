@@ -0,0 +1,309 @@
+"""
+Offline rendering benchmark for VideoEditor.create_shorts.
+
+Builds synthetic scene assets locally (procedural video, sine/noise voiceovers, synthetic
+word timelines, a music bed and a logo), then times create_shorts over a matrix of scene
+counts, aspect ratios, Ken Burns, music and watermark. Each case runs in a fresh
+subprocess so its peak memory (own + render workers/ffmpeg) is measured in isolation.
+
+    python benchmarks/bench_render.py                      # full matrix, compare to baseline
+    python benchmarks/bench_render.py --scenes 3 --aspect 9:16 --ken-burns off
+    python benchmarks/bench_render.py --update-baseline    # record the current numbers
+
+Results are compared against benchmarks/baseline.json (if present); a case regresses when
+its wall time or peak memory grows past the thresholds, and the exit code is then 1.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import itertools
+import subprocess
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+# Benchmark renders shouldn't feed the dashboard's ETA history
+os.environ.setdefault("TRACE_FILE", "")
+
+import numpy as np
+
+FPS = 24
+SOURCE_SIZES = {"9:16": (720, 1280), "16:9": (1280, 720)}
+WORDS = "the quick brown fox jumps over a lazy dog while seven bright stars drift slowly".split()
+
+
+# --- SYNTHETIC ASSETS ---
+
+def make_video(path, duration, size, seed):
+    """Moving gradient + bouncing block, so the encoder sees real motion."""
+    from moviepy.editor import VideoClip
+    width, height = size
+    ys, xs = np.mgrid[0:height, 0:width]
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 255, 3)
+
+    def make_frame(t):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[..., 0] = (xs + t * 60 + base[0]) % 256
+        frame[..., 1] = (ys + t * 40 + base[1]) % 256
+        frame[..., 2] = base[2]
+        x = int((np.sin(t * 1.3 + seed) + 1) / 2 * (width - 160))
+        y = int((np.cos(t * 0.9 + seed) + 1) / 2 * (height - 160))
+        frame[y:y + 160, x:x + 160] = 255
+        return frame
+
+    VideoClip(make_frame, duration=duration).write_videofile(
+        path, fps=FPS, codec="libx264", preset="ultrafast", audio=False, logger=None
+    )
+
+
+def make_voice(path, duration, seed):
+    """Voice-like audio: a modulated tone plus a little noise."""
+    from moviepy.editor import AudioClip
+    freq = 180 + (40 * seed) % 120
+
+    def make_frame(t):
+        tone = np.sin(2 * np.pi * freq * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+        signal = 0.3 * tone + 0.02 * np.random.standard_normal(np.shape(t))
+        return [signal, signal]
+
+    AudioClip(make_frame, duration=duration, fps=44100).write_audiofile(path, fps=44100, logger=None)
+
+
+def make_words(duration, seed, rate=2.5):
+    """Word timeline in SubtitleGenerator's format, ~rate words per second."""
+    words = []
+    step = 1 / rate
+    for i in range(int(duration * rate)):
+        start = i * step
+        words.append({"word": f" {WORDS[(i + seed) % len(WORDS)]}", "start": start, "end": start + step * 0.9})
+    return words
+
+
+def make_logo(path):
+    from PIL import Image, ImageDraw
+    image = Image.new("RGBA", (300, 120), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.rounded_rectangle((0, 0, 299, 119), radius=24, fill=(0, 173, 181, 220))
+    draw.text((40, 45), "BENCH", fill="white")
+    image.save(path)
+
+
+def build_assets(asset_dir, max_scenes, scene_seconds):
+    """Creates (or reuses) the synthetic assets; returns their manifest."""
+    manifest_path = os.path.join(asset_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['scene_seconds'] == scene_seconds and len(manifest['scenes']["9:16"]) >= max_scenes:
+            return manifest
+
+    print(f"Generating synthetic assets in {asset_dir}...")
+    os.makedirs(asset_dir, exist_ok=True)
+    manifest = {'scene_seconds': scene_seconds, 'scenes': {}}
+    audio = []
+    for idx in range(max_scenes):
+        # Voiceovers run a little longer than the clips, so some scenes have to loop
+        duration = scene_seconds + (idx % 3) * 0.5
+        path = os.path.join(asset_dir, f"audio_{idx}.mp3")
+        make_voice(path, duration, idx)
+        audio.append((path, duration))
+    for aspect, size in SOURCE_SIZES.items():
+        manifest['scenes'][aspect] = []
+        for idx in range(max_scenes):
+            video_path = os.path.join(asset_dir, f"video_{aspect.replace(':', 'x')}_{idx}.mp4")
+            make_video(video_path, scene_seconds, size, idx)
+            audio_path, duration = audio[idx]
+            manifest['scenes'][aspect].append({
+                'video': video_path,
+                'audio': audio_path,
+                'subtitles': make_words(duration, idx),
+                'duration': duration,
+            })
+
+    from create_sample_music import make_music
+    manifest['music'] = os.path.join(asset_dir, "music.mp3")
+    make_music(duration=max_scenes * (scene_seconds + 1), filename=manifest['music'])
+    manifest['watermark'] = os.path.join(asset_dir, "logo.png")
+    make_logo(manifest['watermark'])
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+# --- CASES ---
+
+def case_key(case):
+    key = (f"s{case['scenes']}-{case['aspect']}-kb{int(case['ken_burns'])}"
+           f"-m{int(case['music'])}-w{int(case['watermark'])}")
+    if case['backend'] != "moviepy":
+        key += f"-{case['backend']}"
+    if case['draft']:
+        key += "-draft"
+    return key
+
+
+def run_case(case, manifest):
+    """Runs one create_shorts call in this process and returns its measurements."""
+    from src.video_editor import VideoEditor, FULL_PROFILE, DRAFT_PROFILE
+    from src.media_cache import MediaCache
+    from src.tracing import peak_rss_mb
+
+    scene_assets = manifest['scenes'][case['aspect']][:case['scenes']]
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        editor = VideoEditor(font_path=os.path.join(ROOT, "fonts", "Montserrat-Black.ttf"))
+        # Cold render every time unless the scene cache is what's being measured
+        if not case['scene_cache']:
+            editor.scene_cache = MediaCache(root=os.path.join(work_dir, "scene_cache"))
+        output_path = os.path.join(work_dir, "bench.mp4")
+
+        started = time.perf_counter()
+        result = editor.create_shorts(
+            scene_assets, output_path,
+            music_path=manifest['music'] if case['music'] else None,
+            watermark_path=manifest['watermark'] if case['watermark'] else None,
+            use_ken_burns=case['ken_burns'],
+            aspect_ratio=case['aspect'],
+            workers=case['workers'],
+            backend=case['backend'],
+            draft=case['draft'],
+            work_dir=work_dir
+        )
+        wall = time.perf_counter() - started
+
+        fps = (DRAFT_PROFILE if case['draft'] else FULL_PROFILE)['fps']
+        frames = sum(int(a['duration'] * fps) for a in scene_assets)
+        return {
+            'ok': bool(result) and not editor.failed_scenes,
+            'wall_seconds': round(wall, 3),
+            'frames': frames,
+            'fps': round(frames / wall, 2) if wall > 0 else None,
+            'peak_rss_mb': peak_rss_mb(),
+            'children_peak_rss_mb': peak_rss_mb("children"),
+            'output_bytes': os.path.getsize(result) if result else 0,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_case_subprocess(case, manifest_path):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-case", json.dumps(case), "--manifest", manifest_path],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=ROOT
+    )
+    lines = proc.stdout.decode("utf-8", errors="replace").strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        return {'ok': False, 'error': proc.stderr.decode("utf-8", errors="replace").strip()[-2000:]}
+    return json.loads(lines[-1])
+
+
+def compare(results, baseline, time_threshold, memory_threshold):
+    """Returns a list of (key, metric, baseline, current) for every regression."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base or not result.get('ok'):
+            continue
+        if result['wall_seconds'] > base['wall_seconds'] * (1 + time_threshold):
+            regressions.append((key, 'wall_seconds', base['wall_seconds'], result['wall_seconds']))
+        for metric in ('peak_rss_mb', 'children_peak_rss_mb'):
+            if base.get(metric) and result.get(metric) and result[metric] > base[metric] * (1 + memory_threshold):
+                regressions.append((key, metric, base[metric], result[metric]))
+    return regressions
+
+
+def parse_switch(values):
+    return sorted({v == "on" for v in values})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline create_shorts benchmark.")
+    parser.add_argument("--scenes", type=int, nargs="+", default=[3, 6])
+    parser.add_argument("--aspect", nargs="+", choices=list(SOURCE_SIZES), default=list(SOURCE_SIZES))
+    parser.add_argument("--ken-burns", nargs="+", choices=["off", "on"], default=["off", "on"])
+    parser.add_argument("--music", nargs="+", choices=["off", "on"], default=["off", "on"])
+    parser.add_argument("--watermark", nargs="+", choices=["off", "on"], default=["off", "on"])
+    parser.add_argument("--backend", choices=["moviepy", "ffmpeg"], default="moviepy")
+    parser.add_argument("--draft", action="store_true")
+    parser.add_argument("--workers", type=int, default=None, help="Render workers (default: VideoEditor's own plan)")
+    parser.add_argument("--scene-cache", action="store_true", help="Keep the scene render cache (measures re-renders)")
+    parser.add_argument("--scene-seconds", type=float, default=4.0)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the fastest is kept")
+    parser.add_argument("--assets-dir", default=os.path.join(ROOT, ".cache", "bench_assets"))
+    parser.add_argument("--baseline", default=os.path.join(ROOT, "benchmarks", "baseline.json"))
+    parser.add_argument("--output", default=None, help="Write this run's results as JSON")
+    parser.add_argument("--time-threshold", type=float, default=0.15, help="Allowed wall time growth (0.15 = 15%%)")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="Allowed peak memory growth")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--manifest", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        with open(args.manifest) as f:
+            manifest = json.load(f)
+        result = run_case(json.loads(args.run_case), manifest)
+        print(json.dumps(result))
+        return 0
+
+    manifest = build_assets(args.assets_dir, max(args.scenes), args.scene_seconds)
+    manifest_path = os.path.join(args.assets_dir, "manifest.json")
+
+    cases = [
+        {'scenes': scenes, 'aspect': aspect, 'ken_burns': ken_burns, 'music': music, 'watermark': watermark,
+         'backend': args.backend, 'draft': args.draft, 'workers': args.workers, 'scene_cache': args.scene_cache}
+        for scenes, aspect, ken_burns, music, watermark in itertools.product(
+            args.scenes, args.aspect, parse_switch(args.ken_burns), parse_switch(args.music), parse_switch(args.watermark))
+    ]
+
+    results = {}
+    print(f"{'case':<28}{'wall s':>9}{'fps':>9}{'rss MB':>9}{'child MB':>10}")
+    for case in cases:
+        key = case_key(case)
+        runs = [run_case_subprocess(case, manifest_path) for _ in range(args.repeat)]
+        ok_runs = [r for r in runs if r.get('ok')]
+        result = min(ok_runs, key=lambda r: r['wall_seconds']) if ok_runs else runs[-1]
+        results[key] = dict(result, case=case)
+        if result.get('ok'):
+            print(f"{key:<28}{result['wall_seconds']:>9.2f}{result['fps']:>9.1f}"
+                  f"{result['peak_rss_mb'] or 0:>9.0f}{result['children_peak_rss_mb'] or 0:>10.0f}")
+        else:
+            print(f"{key:<28}  FAILED {result.get('error', '')[-300:]}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update({k: r for k, r in results.items() if r.get('ok')})
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    failed = [k for k, r in results.items() if not r.get('ok')]
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --update-baseline to record one.")
+        return 1 if failed else 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.time_threshold, args.memory_threshold)
+    for key, metric, before, after in regressions:
+        print(f"REGRESSION {key}: {metric} {before} -> {after} ({(after / before - 1) * 100:+.0f}%)")
+    if not regressions:
+        print("No regressions against baseline.")
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
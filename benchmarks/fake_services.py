@@ -0,0 +1,323 @@
+"""
+Local stand-ins for the services the fetch stage calls, for offline load tests:
+
+- Pexels search (/videos/search, /v1/search): canned results pointing at /media/...
+- Media files (/media/<name>): Range-capable downloads (206 + Content-Range)
+- ElevenLabs (/v1/text-to-speech/<voice>): audio bytes
+- Edge TTS (/edge-tts): JSON lines of audio and WordBoundary chunks (EDGE_TTS_ENDPOINT)
+- Gemini (/v1beta/models/<model>:generateContent): a script or topic list as JSON
+
+Every request can be delayed (--latency/--jitter ms) and a fraction failed with a 503
+(--failure-rate). A fraction of media transfers can also be cut off partway through the
+body (--truncate-rate), which exercises the client's Range resume. Run standalone and
+point the app at it with the printed variables:
+
+    python benchmarks/fake_services.py --port 8765 --latency 150 --failure-rate 0.02
+"""
+import os
+import re
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STREAM_CHUNK = 64 * 1024
+
+
+class FakeServiceConfig:
+    def __init__(self, latency_ms=0, jitter_ms=0, failure_rate=0.0, truncate_rate=0.0, video_mb=5, audio_kb=64,
+                 bandwidth_mbps=None, results_per_page=5, scenes=12, media_dir=None, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.truncate_rate = truncate_rate
+        self.video_bytes = int(video_mb * 1024 * 1024)
+        self.audio_bytes = int(audio_kb * 1024)
+        self.bandwidth_mbps = bandwidth_mbps
+        self.results_per_page = results_per_page
+        self.scenes = scenes
+        # Serve real files from here when they exist (e.g. to feed the render stage real footage)
+        self.media_dir = media_dir
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.failures = Counter()
+        self.truncations = Counter()
+        self._blobs = {}
+
+    def blob(self, name, size):
+        """Deterministic pseudo-random bytes per name, generated once."""
+        with self.lock:
+            if name not in self._blobs:
+                seed = hashlib.sha256(name.encode()).digest()
+                self._blobs[name] = (seed * (size // len(seed) + 1))[:size]
+            return self._blobs[name]
+
+
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the real APIs
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- plumbing ---
+
+    def _route(self):
+        path = urlparse(self.path).path
+        if path in ("/videos/search", "/v1/search"):
+            return "search"
+        if path.startswith("/media/"):
+            return "media"
+        if path.startswith("/v1/text-to-speech/"):
+            return "elevenlabs"
+        if path == "/edge-tts":
+            return "edge_tts"
+        if ":generateContent" in path:
+            return "gemini"
+        return None
+
+    def _admit(self, route):
+        """Applies the configured latency and failure rate. Returns False if the request was failed."""
+        config = self.config
+        with config.lock:
+            config.requests[route] += 1
+            delay = max(config.latency_ms + config.random.uniform(-config.jitter_ms, config.jitter_ms), 0) / 1000
+            fail = config.random.random() < config.failure_rate
+        time.sleep(delay)
+        if fail:
+            with config.lock:
+                config.failures[route] += 1
+            self._send(503, b'{"error": "injected failure"}', "application/json")
+            return False
+        return True
+
+    def _truncate_at(self, route, size):
+        """Byte offset to hang up at for a transfer picked by --truncate-rate, else None."""
+        config = self.config
+        with config.lock:
+            if size < 2 or config.random.random() >= config.truncate_rate:
+                return None
+            config.truncations[route] += 1
+            return config.random.randint(1, size - 1)
+
+    def _send(self, status, body, content_type, headers=None, truncate_at=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if truncate_at is not None:
+            # Announce the full length, send part of it and drop the connection
+            self.close_connection = True
+            body = body[:truncate_at]
+        self._write(body)
+
+    def _write(self, body):
+        bandwidth = self.config.bandwidth_mbps
+        for start in range(0, len(body), STREAM_CHUNK):
+            chunk = body[start:start + STREAM_CHUNK]
+            self.wfile.write(chunk)
+            if bandwidth:
+                time.sleep(len(chunk) * 8 / (bandwidth * 1e6))
+
+    def _json(self, payload):
+        self._send(200, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _handle(self):
+        route = self._route()
+        if route is None:
+            self._send(404, b"not found", "text/plain")
+            return
+        body = self._read_body() if self.command == "POST" else b""
+        if not self._admit(route):
+            return
+        if route == "search":
+            self._search()
+        elif route == "media":
+            self._media()
+        elif route == "elevenlabs":
+            self._send(200, self.config.blob("elevenlabs", self.config.audio_bytes), "audio/mpeg")
+        elif route == "edge_tts":
+            self._edge_tts(json.loads(body or b"{}"))
+        elif route == "gemini":
+            self._gemini(json.loads(body or b"{}"))
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    # --- services ---
+
+    def _base_url(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def _search(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        query = params.get("query", [""])[0]
+        per_page = int(params.get("per_page", [self.config.results_per_page])[0])
+        portrait = params.get("orientation", ["portrait"])[0] == "portrait"
+        base = self._base_url()
+        slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-") or "clip"
+
+        if url.path == "/videos/search":
+            videos = []
+            for i in range(per_page):
+                media_id = int(hashlib.md5(f"{query}/{i}".encode()).hexdigest()[:8], 16)
+                files = []
+                for w, h in ((540, 960), (1080, 1920), (2160, 3840)):
+                    w, h = (w, h) if portrait else (h, w)
+                    files.append({"id": media_id + h, "quality": "hd", "file_type": "video/mp4", "width": w, "height": h,
+                                  "fps": 25, "size": self.config.video_bytes,
+                                  "link": f"{base}/media/{slug}_{i}_{w}x{h}.mp4"})
+                videos.append({"id": media_id, "image": f"{base}/media/{slug}_{i}.jpg", "video_files": files})
+            self._json({"page": 1, "per_page": per_page, "total_results": per_page, "videos": videos})
+        else:
+            photos = [{"id": int(hashlib.md5(f"{query}/p{i}".encode()).hexdigest()[:8], 16),
+                       "src": {"original": f"{base}/media/{slug}_{i}.jpg", "medium": f"{base}/media/{slug}_{i}_m.jpg"}}
+                      for i in range(per_page)]
+            self._json({"page": 1, "per_page": per_page, "total_results": per_page, "photos": photos})
+
+    def _media(self):
+        name = os.path.basename(urlparse(self.path).path)
+        data = None
+        if self.config.media_dir:
+            path = os.path.join(self.config.media_dir, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    data = f.read()
+        if data is None:
+            data = self.config.blob(name, self.config.video_bytes)
+        content_type = "image/jpeg" if name.endswith(".jpg") else "video/mp4"
+
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if not match:
+            self._send(200, data, content_type, {"Accept-Ranges": "bytes"},
+                       truncate_at=self._truncate_at("media", len(data)))
+            return
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(data) - 1
+        if start >= len(data):
+            self._send(416, b"", content_type, {"Content-Range": f"bytes */{len(data)}"})
+            return
+        end = min(end, len(data) - 1)
+        body = data[start:end + 1]
+        self._send(206, body, content_type,
+                   {"Accept-Ranges": "bytes", "Content-Range": f"bytes {start}-{end}/{len(data)}"},
+                   truncate_at=self._truncate_at("media", len(body)))
+
+    def _edge_tts(self, request):
+        # Same chunk sequence as edge_tts.Communicate.stream(): audio + WordBoundary (100ns ticks)
+        words = request.get("text", "").split()
+        audio = self.config.blob(f"edge:{request.get('text', '')}", self.config.audio_bytes)
+        lines = []
+        per_chunk = max(len(audio) // max(len(words), 1), 1)
+        for i, word in enumerate(words):
+            lines.append({"type": "WordBoundary", "offset": int(i * 0.4 * 1e7), "duration": int(0.35 * 1e7), "text": word})
+            lines.append({"type": "audio", "data": base64.b64encode(audio[i * per_chunk:(i + 1) * per_chunk]).decode()})
+        body = "\n".join(json.dumps(line) for line in lines).encode("utf-8")
+        self._send(200, body, "application/x-ndjson")
+
+    def _gemini(self, request):
+        prompt = " ".join(part.get("text", "") for content in request.get("contents", [])
+                          for part in content.get("parts", []))
+        if "JSON list of strings" in prompt:
+            payload = [f"Fake viral topic #{i + 1}" for i in range(5)]
+        else:
+            match = re.search(r'about: "(.*?)"', prompt)
+            topic = match.group(1) if match else "something"
+            payload = {
+                "title": f"Facts about {topic}",
+                "scenes": [{"text": f"Here is fact number {i + 1} about {topic}, and it is surprising.",
+                            "visual_keyword": f"{topic} scene {i % 4}"} for i in range(self.config.scenes)]
+            }
+        self._json({
+            "candidates": [{"content": {"parts": [{"text": json.dumps(payload)}], "role": "model"},
+                            "finishReason": "STOP", "index": 0}],
+        })
+
+
+def start_fake_services(port=0, host="127.0.0.1", **config):
+    """Starts the stand-ins on a daemon thread. Returns the server; server.base_url is its root URL."""
+    server = ThreadingHTTPServer((host, port), FakeServiceHandler)
+    server.daemon_threads = True
+    server.config = FakeServiceConfig(**config)
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="fake-services", daemon=True).start()
+    return server
+
+
+def service_env(base_url):
+    """Environment that points MediaFetcher and ContentEngine at the stand-ins."""
+    return {
+        "PEXELS_API_BASE": base_url,
+        "PEXELS_FALLBACK_VIDEO_URL": f"{base_url}/media/fallback.mp4",
+        "ELEVENLABS_API_BASE": base_url,
+        "EDGE_TTS_ENDPOINT": f"{base_url}/edge-tts",
+        "GEMINI_API_BASE": base_url,
+        "PEXELS_API_KEY": "fake",
+        "ELEVENLABS_API_KEY": "fake",
+        "GEMINI_API_KEY": "fake",
+    }
+
+
+def add_service_args(parser):
+    parser.add_argument("--latency", type=float, default=0, help="Added latency per request (ms)")
+    parser.add_argument("--jitter", type=float, default=0, help="Latency jitter (+/- ms)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--truncate-rate", type=float, default=0.0,
+                        help="Fraction of media transfers cut off partway through the body")
+    parser.add_argument("--video-mb", type=float, default=5, help="Size of each fake media file")
+    parser.add_argument("--bandwidth", type=float, default=None, help="Per-connection bandwidth cap (Mbit/s)")
+    parser.add_argument("--scenes", type=int, default=12, help="Scenes per fake script")
+    parser.add_argument("--media-dir", default=None, help="Serve real files from here when the name matches")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def service_config(args):
+    return dict(latency_ms=args.latency, jitter_ms=args.jitter, failure_rate=args.failure_rate,
+                truncate_rate=args.truncate_rate, video_mb=args.video_mb, bandwidth_mbps=args.bandwidth, scenes=args.scenes,
+                media_dir=args.media_dir, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-ins for Pexels, Edge TTS, ElevenLabs and Gemini.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_service_args(parser)
+    args = parser.parse_args(argv)
+
+    server = start_fake_services(args.port, args.host, **service_config(args))
+    print(f"Fake services on {server.base_url}. Point the app at them with:")
+    for key, value in service_env(server.base_url).items():
+        print(f"  export {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"Requests: {dict(server.config.requests)}  Injected failures: {dict(server.config.failures)}  "
+              f"Truncated: {dict(server.config.truncations)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Load harness for the fetch stage (script -> search -> download -> TTS).
+
+Runs N jobs at a given concurrency through ContentEngine and AssetPipeline against the
+local stand-ins in fake_services.py (or any --base-url serving the same API), then
+reports job throughput and p50/p95/p99 latency per job and per traced call.
+No real API quota is touched.
+
+    python benchmarks/load_fetch.py --jobs 40 --concurrency 8 --latency 120 --failure-rate 0.02 --truncate-rate 0.05
+
+Caches start empty in a scratch dir and are shared by the jobs of a run, so repeated
+topics measure cache reuse; pass --distinct-topics to make every job cold.
+"""
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+from benchmarks.fake_services import start_fake_services, service_env, add_service_args, service_config
+
+TRACED_CALLS = ("generate_script", "search_media", "download_url", "generate_audio")
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def latency_row(values):
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 50), 4),
+        'p95': round(percentile(values, 95), 4),
+        'p99': round(percentile(values, 99), 4),
+        'max': round(max(values), 4),
+    }
+
+
+def run_job(idx, topic, args):
+    """One fetch job in its own workspace. Returns its latency and outcome."""
+    from src.content_engine import ContentEngine
+    from src.media_fetcher import MediaFetcher
+    from src.subtitle_gen import SubtitleGenerator
+    from src.asset_pipeline import AssetPipeline
+    from src.workspace import get_workspace_manager
+
+    started = time.perf_counter()
+    try:
+        with get_workspace_manager().job(f"load-{idx}") as workspace:
+            if args.skip_script:
+                script = {'title': topic, 'scenes': [
+                    {'text': f"Fact {i + 1} about {topic} that will surprise you.", 'visual_keyword': f"{topic} {i % 4}"}
+                    for i in range(args.scenes)
+                ]}
+            else:
+                script = ContentEngine().generate_script(topic)
+            fetcher = MediaFetcher()
+            pipeline = AssetPipeline(fetcher, SubtitleGenerator(model_size="tiny"), asset_dir=workspace.dir("assets"),
+                                     max_downloads=args.max_downloads, max_tts=args.max_tts)
+            assets = pipeline.produce(script['scenes'], provider=args.voice_provider)
+            ok = all(os.path.exists(a['video']) and os.path.exists(a['audio']) for a in assets)
+            return {'ok': ok, 'seconds': time.perf_counter() - started, 'scenes': len(assets),
+                    'downloads': fetcher.download_summary()}
+    except Exception as e:
+        return {'ok': False, 'seconds': time.perf_counter() - started, 'error': str(e)}
+
+
+def load_spans(path):
+    spans = defaultdict(list)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                span = json.loads(line)
+                spans[span['name']].append(span)
+    return spans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent fetch-stage load test against local stand-in services.")
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--topics", type=int, default=5, help="Size of the topic pool jobs draw from")
+    parser.add_argument("--distinct-topics", action="store_true", help="Give every job its own topic (no cache reuse)")
+    parser.add_argument("--skip-script", action="store_true", help="Build scripts locally instead of calling Gemini")
+    parser.add_argument("--voice-provider", choices=["edge", "elevenlabs"], default="edge")
+    parser.add_argument("--max-downloads", type=int, default=4, help="AssetPipeline download workers per job")
+    parser.add_argument("--max-tts", type=int, default=4, help="AssetPipeline TTS workers per job")
+    parser.add_argument("--base-url", default=None, help="Use already running stand-ins instead of starting them")
+    parser.add_argument("--keep-scratch", action="store_true")
+    parser.add_argument("--output", default=None, help="Write the report as JSON")
+    add_service_args(parser)
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.base_url:
+        base_url = args.base_url.rstrip("/")
+    else:
+        server = start_fake_services(**service_config(args))
+        base_url = server.base_url
+
+    # Endpoints, caches, traces and workspaces have to be set before src is imported
+    scratch = tempfile.mkdtemp(prefix="load_fetch_")
+    os.environ.update(service_env(base_url))
+    os.environ.update({
+        "MEDIA_CACHE_DIR": os.path.join(scratch, "media"),
+        "TTS_CACHE_DIR": os.path.join(scratch, "tts"),
+        "SCRATCH_ROOT": os.path.join(scratch, "work"),
+        "TRACE_FILE": os.path.join(scratch, "traces.jsonl"),
+    })
+    os.environ.pop("PEXELS_SEARCH_CACHE_DIR", None)
+
+    topics = [f"load topic {i if args.distinct_topics else i % args.topics}" for i in range(args.jobs)]
+    print(f"Running {args.jobs} jobs at concurrency {args.concurrency} against {base_url}...")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda job: run_job(job[0], job[1], args), enumerate(topics)))
+    wall = time.perf_counter() - started
+
+    spans = load_spans(os.environ["TRACE_FILE"])
+    downloads = [s for s in spans.get("download_url", []) if not s.get('cache_hit')]
+    download_bytes = sum(s.get('bytes', 0) for s in downloads)
+    report = {
+        'jobs': args.jobs,
+        'concurrency': args.concurrency,
+        'failed_jobs': sum(not r['ok'] for r in results),
+        'wall_seconds': round(wall, 3),
+        'jobs_per_minute': round(args.jobs / wall * 60, 2) if wall > 0 else None,
+        'job_latency': latency_row([r['seconds'] for r in results]),
+        'calls': {name: dict(latency_row([s['seconds'] for s in spans.get(name, []) if not s.get('error')]),
+                             errors=sum(1 for s in spans.get(name, []) if s.get('error')))
+                  for name in TRACED_CALLS},
+        'download_bytes': download_bytes,
+        'download_cache_hits': sum(1 for s in spans.get("download_url", []) if s.get('cache_hit')),
+        'download_resumes': sum(1 for s in downloads if s.get('resumed')),
+        'download_mbps': round(download_bytes * 8 / 1e6 / wall, 2) if wall > 0 else None,
+    }
+    if server:
+        report['server_requests'] = dict(server.config.requests)
+        report['server_injected_failures'] = dict(server.config.failures)
+        report['server_truncated_transfers'] = dict(server.config.truncations)
+
+    print(f"\n{report['jobs']} jobs in {report['wall_seconds']}s ({report['jobs_per_minute']} jobs/min), "
+          f"{report['failed_jobs']} failed")
+    print(f"{'':<18}{'count':>7}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'errors':>8}")
+    rows = [("job", dict(report['job_latency'], errors=report['failed_jobs']))] + list(report['calls'].items())
+    for name, row in rows:
+        if row['count']:
+            print(f"{name:<18}{row['count']:>7}{row['p50']:>9.3f}{row['p95']:>9.3f}{row['p99']:>9.3f}{row['errors']:>8}")
+        else:
+            print(f"{name:<18}{0:>7}{'-':>9}{'-':>9}{'-':>9}{row['errors']:>8}")
+    print(f"Downloaded {download_bytes / 1e6:.1f} MB ({report['download_mbps']} Mbit/s), "
+          f"{report['download_cache_hits']} cache hits, {report['download_resumes']} resumed")
+    if server:
+        print(f"Server requests: {report['server_requests']}  injected failures: {report['server_injected_failures']}  "
+              f"truncated: {report['server_truncated_transfers']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if server:
+        server.shutdown()
+    if not args.keep_scratch:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return 1 if report['failed_jobs'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,8 @@ import streamlit as st
 import asyncio
 import os
 import sys
+import time
+import threading
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
@@ -15,9 +17,13 @@ except Exception as e:
     print(f"Warning: Could not set event loop policy: {e}")
 
 from src.content_engine import ContentEngine
-from src.media_fetcher import MediaFetcher
-from src.subtitle_gen import SubtitleGenerator
-from src.video_editor import VideoEditor
+from src.media_fetcher import MediaFetcher, TARGET_SIZES
+from src.subtitle_gen import SubtitleGenerator, warm_up as warm_up_whisper
+from src.asset_pipeline import AssetPipeline
+from src.proxy_builder import ProxyBuilder
+from src.render_scheduler import get_scheduler, PREVIEW_PRIORITY
+from src.workspace import get_workspace_manager, WorkspaceQuotaError
+from src.tracing import tracer, start_metrics_server
 
 # --- 1. CONFIG & STYLING ---
 st.set_page_config(page_title="ShortsGPT Premium", page_icon="🎬", layout="wide")
@@ -78,6 +84,40 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Preload the shared Whisper model once per server process (not per rerun/session)
+@st.cache_resource
+def start_whisper_warmup():
+    thread = threading.Thread(target=warm_up_whisper, args=("tiny",), daemon=True)
+    thread.start()
+    return thread
+
+start_whisper_warmup()
+
+# Prometheus /metrics endpoint (only if METRICS_PORT is set), one per server process
+@st.cache_resource
+def start_metrics():
+    return start_metrics_server()
+
+start_metrics()
+
+def session_workspace():
+    """This session's private scratch dir for assets, logo and drafts (created on first use)."""
+    manager = get_workspace_manager()
+    workspace = manager.get(st.session_state.workspace) if st.session_state.get('workspace') else None
+    if workspace is None:
+        workspace = manager.create()
+        st.session_state.workspace = workspace.id
+    return workspace
+
+def save_logo(uploaded_logo):
+    """Writes the uploaded logo into the session workspace for a render, or returns None without one."""
+    if not uploaded_logo:
+        return None
+    path = session_workspace().file("logo.png")
+    with open(path, "wb") as f:
+        f.write(uploaded_logo.getbuffer())
+    return path
+
 # --- 2. SESSION STATE MANAGEMENT ---
 # Initialize session state for "Director's Cut" flow
 if 'step' not in st.session_state:
@@ -86,6 +126,10 @@ if 'script_data' not in st.session_state:
     st.session_state.script_data = None
 if 'scene_assets' not in st.session_state:
     st.session_state.scene_assets = []
+# A refreshed page gets a new session: pick a running render back up from the URL
+if 'render_job' not in st.session_state and "job" in st.query_params:
+    st.session_state.render_job = st.query_params["job"]
+    st.session_state.step = 4
 
 # --- 3. SIDEBAR ---
 with st.sidebar:
@@ -121,21 +165,20 @@ with st.sidebar:
 
     
     # Ken Burns
-    use_ken_burns = st.toggle("📸 Ken Burns (Zoom Effect)", value=False, help="Adds slow zoom to images. Compiles slower.")
+    use_ken_burns = st.toggle("📸 Ken Burns (Zoom Effect)", value=False, help="Adds a slow center zoom to every scene.")
     
     # Watermarking
+    # Only written to disk when a render is submitted, so reruns after a render took the
+    # session workspace don't create a new one each time
     uploaded_logo = st.file_uploader("Brand Logo (Watermark)", type=['png', 'jpg'])
-    watermark_path = None
     if uploaded_logo:
-        with open("assets/temp_logo.png", "wb") as f:
-            f.write(uploaded_logo.getbuffer())
-        watermark_path = "assets/temp_logo.png"
         st.success("Logo Uploaded!")
 
     # 2. AUDIO
     st.subheader("🔊 Audio")
     music_files = [f for f in os.listdir("songs") if f.endswith(('.mp3', '.wav'))] if os.path.exists("songs") else []
     music_choice = st.selectbox("Background Music", ["None"] + music_files)
+    duck_music = st.toggle("🎚️ Duck Music Under Voice", value=False, disabled=music_choice == "None", help="Lowers the music while the voiceover is speaking.")
     
     # ElevenLabs
     el_key_exists = os.getenv("ELEVENLABS_API_KEY") is not None
@@ -145,8 +188,13 @@ with st.sidebar:
     
     st.divider()
     if st.button("🔄 Reset Project"):
+        # A workspace already handed to a render is cleaned up by the scheduler
+        workspace = get_workspace_manager().get(st.session_state.workspace) if st.session_state.get('workspace') else None
+        if workspace:
+            workspace.cleanup()
         for key in list(st.session_state.keys()):
             del st.session_state[key]
+        st.query_params.clear()
         st.rerun()
 
 # --- 4. MAIN APP LOGIC ---
@@ -283,42 +331,36 @@ elif st.session_state.step == 3:
     
     # Result container
     scene_assets = []
-    os.makedirs("assets", exist_ok=True)
     
-    # Fetch Loop
+    # Fetch Pipeline
     if not st.session_state.get('assets_ready'):
         fetcher = MediaFetcher()
         sub_gen = SubtitleGenerator(model_size="tiny")
+        try:
+            asset_dir = session_workspace().dir("assets")
+        except WorkspaceQuotaError as e:
+            st.error(f"The server is out of scratch space, try again later. ({e})")
+            st.stop()
+        # Proxies always get zoom headroom, so Ken Burns can still be toggled on in the review step
+        pipeline = AssetPipeline(fetcher, sub_gen, asset_dir=asset_dir, proxy_builder=ProxyBuilder())
         
         # Audio Provider
         voice_provider = "elevenlabs" if use_elevenlabs else "edge"
         
-        for idx, scene in enumerate(script_data['scenes']):
-            status_text.text(f"🎬 Producing Scene {idx+1}/{total_scenes}: {scene['visual_keyword']}")
-            
-            video_filename = f"assets/video_{idx}.mp4"
-            audio_filename = f"assets/audio_{idx}.mp3"
-            
-            # 1. Video
-            # Pass orientation from sidebar
-            fetcher.download_video(scene['visual_keyword'], 5, video_filename, orientation=orientation)  
-            
-            # 2. Audio
-            if use_elevenlabs:
-                fetcher.generate_audio_elevenlabs(scene['text'], audio_filename)
-            else:
-                asyncio.run(fetcher.generate_audio(scene['text'], audio_filename))
-            
-            # 3. Subtitles
-            subtitles = sub_gen.generate_subtitles(audio_filename)
-            
-            scene_assets.append({
-                'video': video_filename,
-                'audio': audio_filename,
-                'subtitles': subtitles
-            })
-            
-            progress_bar.progress((idx + 1) / total_scenes)
+        stage_labels = {"video": "🎞️ Footage", "proxy": "🧰 Proxy", "audio": "🗣️ Voiceover", "subtitles": "💬 Subtitles"}
+        
+        def update_progress(stage, idx, done, total):
+            keyword = script_data['scenes'][idx]['visual_keyword']
+            status_text.text(f"{stage_labels[stage]} ready for Scene {idx+1}/{total_scenes}: {keyword}")
+            progress_bar.progress(done / total)
+        
+        status_text.text(f"🎬 Producing {total_scenes} scenes...")
+        scene_assets = pipeline.produce(
+            script_data['scenes'],
+            orientation=orientation,
+            provider=voice_provider,
+            on_progress=update_progress
+        )
 
         st.session_state.scene_assets = scene_assets
         st.session_state.assets_ready = True
@@ -335,17 +377,102 @@ elif st.session_state.step == 3:
                 st.video(asset['video'])
                 st.caption(f"Scene {i+1} Asset")
         
-        if st.button("🚀 Render Final Video", type="primary"):
+        def fitted_assets():
+            """Scene assets with their proxies rebuilt if the format was switched after fetching."""
+            with st.spinner("Fitting footage to the video format..."):
+                st.session_state.scene_assets = ProxyBuilder().refit(st.session_state.scene_assets, TARGET_SIZES[orientation])
+            return st.session_state.scene_assets
+
+        draft = get_scheduler().get(st.session_state.draft_job) if st.session_state.get('draft_job') else None
+        drafting = bool(draft and draft['status'] in ("queued", "running"))
+
+        # Quick low-res draft to check subtitles, timing and zoom before the full render.
+        # Queued ahead of final renders on the shared scheduler, so previews stay within RENDER_CONCURRENCY too.
+        # One draft per session at a time: another click would only queue a duplicate behind it
+        if st.button("⚡ Quick Preview (Draft)", disabled=drafting):
+            st.session_state.draft_job = get_scheduler().submit(
+                fitted_assets(),
+                session_workspace().file("draft_preview.mp4"),
+                font_path=f"fonts/{font_choice}",
+                music_path=f"songs/{music_choice}" if music_choice != "None" else None,
+                watermark_path=save_logo(uploaded_logo),
+                use_ken_burns=use_ken_burns,
+                aspect_ratio="16:9" if "16:9" in aspect_ratio else "9:16",
+                text_color=text_color,
+                duck_music=duck_music,
+                draft=True,
+                priority=PREVIEW_PRIORITY
+            )
+            st.rerun()
+        
+        if drafting:
+            if draft['status'] == "queued":
+                st.info(f"⏳ Draft preview waiting for a render slot: #{draft['position']} in line")
+            else:
+                st.info(f"⚡ Rendering draft preview: {draft['done']}/{draft['total']} scenes")
+        elif draft and draft['status'] == "done":
+            st.caption("Draft preview (low resolution)")
+            st.video(draft['result'])
+        elif draft:
+            st.error(f"Draft preview {draft['status']}: {draft['error'] or ''}")
+        
+        # The final render takes over (and later removes) the workspace the draft reads its scenes from,
+        # so a draft that is already rendering has to finish first; a queued one is cancelled
+        draft_running = bool(draft and draft['status'] == "running")
+        if st.button("🚀 Render Final Video", type="primary", disabled=draft_running,
+                     help="Available once the draft preview finishes." if draft_running else None):
+            if drafting and not get_scheduler().cancel(draft['id']):
+                # The draft started between this page's poll and the click
+                st.rerun()
+            # Queued on the shared background scheduler; this session just polls it
+            job_id = get_scheduler().submit(
+                fitted_assets(),
+                font_path=f"fonts/{font_choice}",
+                music_path=f"songs/{music_choice}" if music_choice != "None" else None,
+                watermark_path=save_logo(uploaded_logo),
+                use_ken_burns=use_ken_burns,
+                aspect_ratio="16:9" if "16:9" in aspect_ratio else "9:16",
+                text_color=text_color,
+                duck_music=duck_music,
+                workspace=session_workspace()
+            )
+            # The render job owns the workspace now and removes it when it finishes
+            del st.session_state['workspace']
+            st.session_state.render_job = job_id
+            st.query_params["job"] = job_id
             st.session_state.step = 4
             st.rerun()
+        
+        if drafting:
+            # Poll the draft like step 4 polls the final render
+            time.sleep(1)
+            st.rerun()
 
 # STEP 4: FINAL ASSEMBLY
 elif st.session_state.step == 4:
+    job = get_scheduler().get(st.session_state.render_job)
+    if job is None:
+        st.error("This render job has expired or the server was restarted.")
+        if st.button("🔙 Back"):
+            del st.session_state['render_job']
+            st.query_params.clear()
+            # The scene assets went with the render's workspace
+            st.session_state.scene_assets = []
+            st.session_state.assets_ready = False
+            st.session_state.step = 2 if st.session_state.script_data else 1
+            st.rerun()
+        st.stop()
+
+    rendering = job['status'] in ("queued", "running")
     with st.status("✂️ Stitching Director's Cut...", expanded=True) as status:
         
         # Calculate Estimated Time
-        num_scenes = len(st.session_state.scene_assets)
-        est_time = num_scenes * 15 # Approx 15 seconds per scene for rendering
+        # Median seconds per scene of recent successful full renders (15s/scene until there is history)
+        num_scenes = job['total']
+        est_time = tracer.estimate("create_shorts", units=num_scenes, unit_attr="scenes", default=15, draft=False, failed=None)
+        if job['started']:
+            est_time = max(est_time - (time.time() - job['started']), 0)
+        est_time = int(round(est_time))
         
         # Premium Loading Animation (Dynamic Theme)
         st.markdown(f"""
@@ -387,28 +514,32 @@ elif st.session_state.step == 4:
         </div>
         """, unsafe_allow_html=True)
 
-        editor = VideoEditor(font_path=f"fonts/{font_choice}")
-        output_file = "assets/final_director_cut.mp4"
-        
-        music_path = f"songs/{music_choice}" if music_choice != "None" else None
+        if job['status'] == "queued":
+            st.write(f"⏳ Waiting for a render slot: #{job['position']} in line")
+        elif job['status'] == "running":
+            if job['stage'] == "assemble":
+                st.write("🧵 Joining scenes...")
+            elif job['stage'] == "music":
+                st.write("🎵 Mixing background music...")
+            else:
+                st.write(f"🎞️ Rendered {job['done']}/{job['total']} scenes")
+            st.progress(job['done'] / max(job['total'], 1))
         
-        # Extract 9:16 or 16:9 from selector "Shorts (9:16)"
-        clean_aspect = "9:16"
-        if "16:9" in aspect_ratio:
-            clean_aspect = "16:9"
-
-        result_path = editor.create_shorts(
-            st.session_state.scene_assets, 
-            output_file, 
-            music_path=music_path,
-            watermark_path=watermark_path,
-            use_ken_burns=use_ken_burns,
-            aspect_ratio=clean_aspect,
-            text_color=text_color
-        )
-        status.update(label="Rendering Complete!", state="complete")
+        if not rendering:
+            status.update(label="Rendering Complete!" if job['status'] == "done" else "Rendering Failed",
+                          state="complete" if job['status'] == "done" else "error")
     
-    if result_path:
+    if rendering:
+        # The render runs on the shared scheduler; poll it instead of blocking this session
+        if job['status'] == "queued" and st.button("✖️ Cancel Render"):
+            get_scheduler().cancel(job['id'])
+        time.sleep(1)
+        st.rerun()
+    elif job['status'] == "done":
         st.balloons()
         st.success("✨ Your Masterpiece is Ready!")
-        st.video(result_path)
+        if job['failed_scenes']:
+            st.warning(f"{len(job['failed_scenes'])} scene(s) failed to render and were skipped.")
+        st.video(job['result'])
+    else:
+        st.error(f"Render {job['status']}: {job['error'] or ''}")
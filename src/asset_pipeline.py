@@ -0,0 +1,151 @@
+import os
+import asyncio
+from src.media_fetcher import TARGET_SIZES
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class AssetPipeline:
+    """
+    Produces the per-scene assets (video, voiceover, subtitles) for a script.
+    Downloads, TTS and transcription run as overlapping stages so a job costs
+    roughly as long as its slowest scene instead of the sum of all of them.
+    Whisper only runs for voiceovers whose provider gave no word timings.
+    """
+
+    STAGES = ("video", "proxy", "audio", "subtitles")
+
+    def __init__(self, fetcher, sub_gen, asset_dir="assets", max_downloads=4, max_tts=4, batch_transcription=True,
+                 proxy_builder=None, max_ingest=2):
+        self.fetcher = fetcher
+        self.sub_gen = sub_gen
+        # Optional ingest stage: normalize each clip to a render-ready proxy right after download
+        self.proxy_builder = proxy_builder
+        self.max_ingest = max_ingest
+        self.asset_dir = asset_dir
+        self.max_downloads = max_downloads
+        self.max_tts = max_tts
+        # Transcribe the timing-less voiceovers that pile up while Whisper is busy in one pass,
+        # instead of one Whisper call per scene as each file lands
+        self.batch_transcription = batch_transcription
+
+    def _fetch_video(self, scene, filename, orientation):
+        self.fetcher.download_video(scene['visual_keyword'], 5, filename, orientation=orientation)
+        return filename
+
+    def _build_proxy(self, video_path, proxy_path, orientation):
+        if not os.path.exists(video_path):
+            return None
+        return self.proxy_builder.make_proxy(video_path, proxy_path, self._canvas(orientation))
+
+    @staticmethod
+    def _canvas(orientation):
+        return TARGET_SIZES.get(orientation, TARGET_SIZES["portrait"])
+
+    def _generate_audio(self, scene, filename, provider):
+        """Returns word timings when the provider reports them, otherwise an empty list."""
+        # Same fallback as MediaFetcher.generate_audio: ElevenLabs without a key becomes Edge TTS,
+        # which also gives us word timings
+        if self.fetcher.tts_provider(provider) == "elevenlabs":
+            self.fetcher.generate_audio_elevenlabs(scene['text'], filename)
+            return []
+        # Each TTS worker thread gets its own event loop
+        return asyncio.run(self.fetcher.generate_audio_with_timings(scene['text'], filename)) or []
+
+    def produce(self, scenes, orientation="portrait", provider="edge", on_progress=None):
+        """
+        Runs every scene through the pipeline and returns the scene assets in scene order.
+        on_progress(stage, scene_idx, done, total) is called from the calling thread,
+        so it is safe to update Streamlit widgets from it.
+        """
+        os.makedirs(self.asset_dir, exist_ok=True)
+        total = len(scenes) * len(self.STAGES)
+        done = 0
+
+        scene_assets = [
+            {
+                'video': os.path.join(self.asset_dir, f"video_{idx}.mp4"),
+                'audio': os.path.join(self.asset_dir, f"audio_{idx}.mp3"),
+                'subtitles': []
+            }
+            for idx in range(len(scenes))
+        ]
+
+        # One transcription worker per warm Whisper model in the shared pool
+        with ThreadPoolExecutor(max_workers=self.max_downloads) as download_pool, \
+             ThreadPoolExecutor(max_workers=self.max_ingest) as ingest_pool, \
+             ThreadPoolExecutor(max_workers=self.max_tts) as tts_pool, \
+             ThreadPoolExecutor(max_workers=self.sub_gen.pool.size) as transcribe_pool:
+
+            pending = {}
+            needs_whisper = []
+            transcribing = 0
+            for idx, scene in enumerate(scenes):
+                asset = scene_assets[idx]
+                pending[download_pool.submit(self._fetch_video, scene, asset['video'], orientation)] = ("video", idx)
+                pending[tts_pool.submit(self._generate_audio, scene, asset['audio'], provider)] = ("audio", idx)
+
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, idx = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"{stage} stage failed for scene {idx}: {e}")
+                        result = None
+
+                    if stage == "subtitles_batch":
+                        transcribing -= 1
+                        # idx holds every scene that went into the batch
+                        for scene_idx, words in zip(idx, result or [[] for _ in idx]):
+                            scene_assets[scene_idx]['subtitles'] = words
+                            done += 1
+                            if on_progress:
+                                on_progress("subtitles", scene_idx, done, total)
+                        continue
+
+                    done += 1
+                    if on_progress:
+                        on_progress(stage, idx, done, total)
+
+                    if stage == "subtitles":
+                        scene_assets[idx]['subtitles'] = result or []
+                    elif stage == "video":
+                        if self.proxy_builder:
+                            proxy_path = os.path.join(self.asset_dir, f"proxy_{idx}.mp4")
+                            future = ingest_pool.submit(self._build_proxy, scene_assets[idx]['video'], proxy_path, orientation)
+                            pending[future] = ("proxy", idx)
+                        else:
+                            done += 1
+                            if on_progress:
+                                on_progress("proxy", idx, done, total)
+                    elif stage == "proxy" and result:
+                        # The editor only ever reads the proxy from here on; the source and canvas
+                        # are kept so ProxyBuilder.refit can rebuild it if the output format changes
+                        scene_assets[idx]['source'] = scene_assets[idx]['video']
+                        scene_assets[idx]['proxy_size'] = self._canvas(orientation)
+                        scene_assets[idx]['video'] = result
+                    elif stage == "audio":
+                        if result:
+                            # Edge TTS already told us when each word is spoken, no need for Whisper
+                            scene_assets[idx]['subtitles'] = result
+                            done += 1
+                            if on_progress:
+                                on_progress("subtitles", idx, done, total)
+                        elif self.batch_transcription:
+                            needs_whisper.append(idx)
+                        else:
+                            # Hand the voiceover to the transcriber as soon as it exists
+                            audio_path = scene_assets[idx]['audio']
+                            pending[transcribe_pool.submit(self.sub_gen.generate_subtitles, audio_path)] = ("subtitles", idx)
+
+                # Batch whatever voiceovers are ready whenever a Whisper worker is free, so
+                # transcription still overlaps TTS and batches grow only while Whisper is busy
+                if needs_whisper and transcribing < self.sub_gen.pool.size:
+                    audio_paths = [scene_assets[i]['audio'] for i in needs_whisper]
+                    future = transcribe_pool.submit(self.sub_gen.generate_subtitles_batch, audio_paths)
+                    pending[future] = ("subtitles_batch", tuple(needs_whisper))
+                    needs_whisper = []
+                    transcribing += 1
+
+        return scene_assets
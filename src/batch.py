@@ -0,0 +1,226 @@
+"""
+Headless batch generation: topic/script file in, one short + manifest per job out.
+
+    python -m src.batch topics.txt --concurrency 4 --out-dir batch_output
+
+Input formats:
+- .txt: one topic per line
+- .json: a list of jobs; .jsonl: one job per line
+  A job is a topic string, {"topic": "..."}, a script {"title": ..., "scenes": [...]}
+  or {"script": {...}}. Any of the option names below can be overridden per job.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.content_engine import ContentEngine
+from src.media_fetcher import MediaFetcher
+from src.subtitle_gen import SubtitleGenerator
+from src.video_editor import VideoEditor
+from src.asset_pipeline import AssetPipeline
+from src.proxy_builder import ProxyBuilder
+from src.workspace import get_workspace_manager
+from src.tracing import start_metrics_server
+
+DEFAULT_OPTIONS = {
+    'aspect_ratio': "9:16",
+    'voice_provider': "edge",
+    'font': "fonts/Montserrat-Black.ttf",
+    'text_color': "white",
+    'music': None,
+    'duck_music': False,
+    'watermark': None,
+    'ken_burns': False,
+    'backend': None,
+    'draft': False,
+    'render_workers': None,
+}
+
+
+def load_jobs(path):
+    """Reads a topics/scripts file into a list of job dicts."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            raw = [json.loads(line) for line in f if line.strip()]
+        elif path.endswith(".json"):
+            raw = json.load(f)
+        else:
+            raw = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    jobs = []
+    for entry in raw:
+        if isinstance(entry, str):
+            entry = {'topic': entry}
+        elif 'scenes' in entry:
+            entry = {'script': entry}
+        jobs.append(entry)
+    return jobs
+
+
+def job_slug(job_id):
+    """Makes a job id safe to use as a directory and workspace name. Raises ValueError if nothing usable is left."""
+    slug = re.sub(r'[^\w.-]', '_', str(job_id))
+    if not slug.strip('.'):
+        raise ValueError(f"Invalid job id: {job_id!r}")
+    return slug
+
+
+def run_job(job_id, job, out_dir, options=None):
+    """
+    Runs the whole pipeline for one job: script -> assets -> render.
+    Intermediates live in a scratch workspace that is removed when the job ends; only the
+    short, its script and the manifest are kept. Returns the job manifest (also written to
+    <out_dir>/<job_id>/manifest.json).
+    """
+    job_id = job_slug(job_id)
+    opts = dict(DEFAULT_OPTIONS)
+    opts.update(options or {})
+    opts.update({k: v for k, v in job.items() if k in DEFAULT_OPTIONS})
+
+    job_dir = os.path.join(out_dir, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    orientation = "landscape" if opts['aspect_ratio'] == "16:9" else "portrait"
+
+    manifest = {
+        'id': job_id,
+        'topic': job.get('topic'),
+        'status': "running",
+        'options': opts,
+        'timings': {},
+        'output': None,
+        'error': None,
+    }
+    started = time.perf_counter()
+
+    def timed(stage, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            manifest['timings'][stage] = round(time.perf_counter() - t0, 3)
+
+    try:
+        with get_workspace_manager().job(job_id) as workspace:
+            # 1. Script
+            script = job.get('script')
+            if not script:
+                script = timed("script", ContentEngine().generate_script, job['topic'])
+            manifest['title'] = script.get('title')
+            with open(os.path.join(job_dir, "script.json"), "w", encoding="utf-8") as f:
+                json.dump(script, f, indent=2)
+
+            # 2. Assets
+            fetcher = MediaFetcher()
+            pipeline = AssetPipeline(fetcher, SubtitleGenerator(model_size="tiny"),
+                                     asset_dir=workspace.dir("assets"),
+                                     proxy_builder=ProxyBuilder())
+            scene_assets = timed("assets", pipeline.produce, script['scenes'],
+                                 orientation=orientation, provider=opts['voice_provider'],
+                                 on_progress=lambda *_: workspace.touch())
+            manifest['downloads'] = fetcher.download_summary()
+            workspace.check_quota()
+
+            # 3. Render
+            editor = VideoEditor(font_path=opts['font'])
+            output = timed("render", editor.create_shorts, scene_assets,
+                           os.path.join(job_dir, "short.mp4"),
+                           music_path=opts['music'],
+                           watermark_path=opts['watermark'],
+                           use_ken_burns=opts['ken_burns'],
+                           aspect_ratio=opts['aspect_ratio'],
+                           text_color=opts['text_color'],
+                           workers=opts['render_workers'],
+                           backend=opts['backend'],
+                           duck_music=opts['duck_music'],
+                           draft=opts['draft'],
+                           work_dir=workspace.dir("render"),
+                           on_progress=lambda *_: workspace.touch())
+            manifest['failed_scenes'] = editor.failed_scenes
+            manifest['output'] = output
+            manifest['status'] = "done" if output else "failed"
+    except Exception as e:
+        manifest['status'] = "failed"
+        manifest['error'] = f"{e}\n{traceback.format_exc()}"
+        print(f"Job {job_id} failed: {e}")
+
+    manifest['timings']['total'] = round(time.perf_counter() - started, 3)
+    with open(os.path.join(job_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def run_batch(jobs, out_dir="batch_output", concurrency=2, options=None):
+    """
+    Runs jobs on a pool of `concurrency` workers and returns their manifests in input order.
+    Each render also fans out to its own scene workers, so by default the CPU is split
+    between the concurrent jobs.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    options = dict(options or {})
+    if not options.get('render_workers'):
+        options['render_workers'] = max(1, (os.cpu_count() or 1) // concurrency)
+
+    # Ids come from the jobs file and name directories, so check them all before any job starts
+    job_ids = [job_slug(job.get('id') or f"job_{idx:04d}") for idx, job in enumerate(jobs)]
+    duplicates = sorted({job_id for job_id in job_ids if job_ids.count(job_id) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate job ids: {', '.join(duplicates)}")
+
+    started = time.perf_counter()
+    manifests = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(run_job, job_ids[idx], job, out_dir, options): idx
+            for idx, job in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            idx = futures[future]
+            manifests[idx] = future.result()
+            print(f"[{sum(m is not None for m in manifests)}/{len(jobs)}] {manifests[idx]['id']}: {manifests[idx]['status']}")
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'jobs': len(jobs),
+        'done': sum(m['status'] == "done" for m in manifests),
+        'failed': sum(m['status'] != "done" for m in manifests),
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'jobs_per_hour': round(len(jobs) / elapsed * 3600, 2) if elapsed > 0 else None,
+        'manifests': manifests,
+    }
+    with open(os.path.join(out_dir, "batch_manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return manifests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate shorts in bulk without the Streamlit UI.")
+    parser.add_argument("jobs", help="Topics (.txt) or scripts (.json / .jsonl)")
+    parser.add_argument("--out-dir", default="batch_output")
+    parser.add_argument("--concurrency", type=int, default=2, help="Jobs running at the same time")
+    parser.add_argument("--aspect-ratio", choices=["9:16", "16:9"], default="9:16")
+    parser.add_argument("--voice-provider", choices=["edge", "elevenlabs"], default="edge")
+    parser.add_argument("--font", default=DEFAULT_OPTIONS['font'])
+    parser.add_argument("--text-color", default="white")
+    parser.add_argument("--music", default=None)
+    parser.add_argument("--duck-music", action="store_true")
+    parser.add_argument("--watermark", default=None)
+    parser.add_argument("--ken-burns", action="store_true")
+    parser.add_argument("--backend", choices=["moviepy", "ffmpeg"], default=None)
+    parser.add_argument("--draft", action="store_true")
+    parser.add_argument("--render-workers", type=int, default=None, help="Scene workers per job")
+    args = parser.parse_args(argv)
+
+    options = {k: getattr(args, k) for k in DEFAULT_OPTIONS}
+    start_metrics_server()
+    manifests = run_batch(load_jobs(args.jobs), args.out_dir, args.concurrency, options)
+    return 0 if all(m['status'] == "done" for m in manifests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
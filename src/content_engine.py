@@ -3,6 +3,7 @@ import json
 import google.generativeai as genai
 import streamlit as st
 from dotenv import load_dotenv
+from src.tracing import tracer, traced
 
 load_dotenv()
 
@@ -16,9 +17,15 @@ class ContentEngine:
         if not self.api_key:
              raise ValueError("GEMINI_API_KEY not found in .env or secrets")
         
-        genai.configure(api_key=self.api_key)
+        # Optional REST endpoint override, e.g. a local stand-in (benchmarks/fake_services.py)
+        api_base = os.getenv("GEMINI_API_BASE")
+        if api_base:
+            genai.configure(api_key=self.api_key, transport="rest", client_options={"api_endpoint": api_base})
+        else:
+            genai.configure(api_key=self.api_key)
         self.model = genai.GenerativeModel('gemini-1.5-flash-latest')
 
+    @traced("generate_script")
     def generate_script(self, topic):
         prompt = f"""
         You are a professional short-form video script writer.
@@ -47,6 +54,7 @@ class ContentEngine:
         except Exception as e:
             st.warning(f"⚠️ AI Busy ({e}). Switching to Offline Template.")
             print(f"Error generating script: {e}")
+            tracer.fail(e)
             # Fallback Template so the app NEVER stops working
             return {
                 "title": f"Viral Video: {topic}",
@@ -0,0 +1,164 @@
+import os
+from PIL import ImageColor, ImageFont
+from src.ffmpeg_tools import run_ffmpeg, probe_duration, is_still_image
+
+FPS = 24
+
+
+def _ass_time(seconds):
+    centis = int(round(seconds * 100))
+    hours, centis = divmod(centis, 360000)
+    minutes, centis = divmod(centis, 6000)
+    secs, centis = divmod(centis, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centis:02d}"
+
+
+def _ass_color(color):
+    # ASS colours are &HAABBGGRR
+    r, g, b = ImageColor.getrgb(color)[:3]
+    return f"&H00{b:02X}{g:02X}{r:02X}"
+
+
+def _filter_path(path):
+    # Quote a path for use as a filter option value (':' and '\'' are special)
+    path = os.path.abspath(path).replace("\\", "/")
+    return "'" + path.replace(":", "\\:").replace("'", "\\'") + "'"
+
+
+class FFmpegRenderer:
+    """
+    Alternative create_shorts backend that turns a whole job into a single ffmpeg
+    filter_complex: scale/crop (+ zoompan Ken Burns), looping, per-scene trims, concat,
+    ASS word subtitles and the watermark overlay. Music is mixed afterwards by the
+    audio-only pass in VideoEditor.add_music.
+    Frames never pass through Python, so rendering isn't bound by the GIL.
+    """
+
+    def __init__(self, font_path):
+        self.font_path = font_path
+        # (scene index, reason) for each scene the last render left out, like VideoEditor.failed_scenes
+        self.failed_scenes = []
+        try:
+            self.font_name = ImageFont.truetype(font_path, 80).getname()[0]
+        except OSError:
+            # e.g. "Arial": let libass resolve it from the system fonts
+            self.font_name = os.path.splitext(os.path.basename(font_path))[0]
+
+    def _write_ass(self, path, scene_assets, durations, size, text_color, font_size=80, stroke_width=2):
+        width, height = size
+        lines = [
+            "[Script Info]",
+            "ScriptType: v4.00+",
+            f"PlayResX: {width}",
+            f"PlayResY: {height}",
+            "WrapStyle: 2",
+            "",
+            "[V4+ Styles]",
+            "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+            "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+            "Alignment, MarginL, MarginR, MarginV, Encoding",
+            # Centered (alignment 5), black 2px outline: same look as the MoviePy subtitles
+            f"Style: Word,{self.font_name},{font_size},{_ass_color(text_color)},&H000000FF,&H00000000,&H00000000,"
+            f"0,0,0,0,100,100,0,0,1,{stroke_width},0,5,0,0,0,1",
+            "",
+            "[Events]",
+            "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+        ]
+
+        offset = 0.0
+        for asset, duration in zip(scene_assets, durations):
+            for item in asset['subtitles']:
+                word = item['word'].strip().replace("\\", "").replace("{", "(").replace("}", ")")
+                start = min(item['start'], duration)
+                end = min(item['end'], duration)
+                if end <= start or not word:
+                    continue
+                lines.append(f"Dialogue: 0,{_ass_time(offset + start)},{_ass_time(offset + end)},Word,,0,0,0,,{word}")
+            offset += duration
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def render(self, scene_assets, output_path, watermark_path=None, use_ken_burns=False,
+               size=(1080, 1920), text_color="white", fps=FPS, font_size=80, stroke_width=2,
+               preset="ultrafast", crf=23, watermark_height=100):
+        """Renders the job with one ffmpeg invocation. Returns output_path, or None on failure."""
+        width, height = size
+
+        # Scene length follows the voiceover, as in the MoviePy path
+        scenes = []
+        self.failed_scenes = []
+        for idx, asset in enumerate(scene_assets):
+            duration = probe_duration(asset['audio']) if os.path.exists(asset['audio']) else None
+            if not duration or not os.path.exists(asset['video']):
+                print(f"Skipping scene with missing media: {asset['video']}")
+                self.failed_scenes.append((idx, "missing or unreadable media"))
+                continue
+            scenes.append((asset, duration))
+        if not scenes:
+            print("No valid scenes to compile.")
+            return None
+
+        inputs = [] # (input options, path); list index == ffmpeg input index
+        filters = []
+        for i, (asset, duration) in enumerate(scenes):
+            video_idx = len(inputs)
+            if is_still_image(asset['video']):
+                inputs.append((["-loop", "1"], asset['video']))
+            else:
+                inputs.append((["-stream_loop", "-1"], asset['video']))
+            audio_idx = len(inputs)
+            inputs.append(([], asset['audio']))
+
+            chain = (f"[{video_idx}:v]scale={width}:{height}:force_original_aspect_ratio=increase,"
+                     f"crop={width}:{height},fps={fps},setsar=1")
+            if use_ken_burns:
+                # Same 1 + 0.02 * t center zoom as cover_zoom, at a fixed output size
+                chain += (f",zoompan=z='1+0.02*on/{fps}':x='iw/2-(iw/zoom/2)':y='ih/2-(ih/zoom/2)'"
+                          f":d=1:s={width}x{height}:fps={fps}")
+            filters.append(f"{chain},trim=duration={duration:.3f},setpts=PTS-STARTPTS,format=yuv420p[v{i}]")
+            filters.append(f"[{audio_idx}:a]aformat=sample_rates=44100:channel_layouts=stereo,apad,"
+                           f"atrim=duration={duration:.3f},asetpts=PTS-STARTPTS[a{i}]")
+
+        concat_inputs = "".join(f"[v{i}][a{i}]" for i in range(len(scenes)))
+        filters.append(f"{concat_inputs}concat=n={len(scenes)}:v=1:a=1[vcat][acat]")
+
+        ass_path = f"{output_path}.ass"
+        self._write_ass(ass_path, [a for a, _ in scenes], [d for _, d in scenes], size, text_color, font_size, stroke_width)
+        subtitle_filter = f"[vcat]subtitles=filename={_filter_path(ass_path)}"
+        if os.path.exists(self.font_path):
+            subtitle_filter += f":fontsdir={_filter_path(os.path.dirname(self.font_path))}"
+        filters.append(subtitle_filter + "[vsub]")
+        video_out = "vsub"
+
+        if watermark_path and os.path.exists(watermark_path):
+            wm_idx = len(inputs)
+            inputs.append(([], watermark_path))
+            filters.append(f"[{wm_idx}:v]scale=-1:{watermark_height}[wm]")
+            filters.append(f"[vsub][wm]overlay=W-w-20:20[vout]")
+            video_out = "vout"
+
+        input_args = []
+        for options, path in inputs:
+            input_args += options + ["-i", path]
+
+        total_duration = sum(d for _, d in scenes)
+        print(f"Rendering {len(scenes)} scenes with ffmpeg filtergraph...")
+        try:
+            run_ffmpeg(input_args + [
+                "-filter_complex", ";".join(filters),
+                "-map", f"[{video_out}]", "-map", "[acat]",
+                "-t", f"{total_duration:.3f}",
+                "-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p", "-r", str(fps),
+                "-c:a", "aac",
+                "-movflags", "+faststart",
+                output_path
+            ])
+        except (RuntimeError, OSError) as e:
+            print(f"FFmpeg render failed: {e}")
+            return None
+        finally:
+            if os.path.exists(ass_path):
+                os.remove(ass_path)
+
+        return output_path
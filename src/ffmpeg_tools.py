@@ -0,0 +1,127 @@
+import os
+import re
+import subprocess
+from moviepy.config import get_setting
+
+
+def ffmpeg_binary():
+    # Same binary MoviePy uses (imageio-ffmpeg's bundled build unless overridden)
+    return get_setting("FFMPEG_BINARY")
+
+
+def run_ffmpeg(args):
+    """Runs ffmpeg with the given arguments, raising RuntimeError with its stderr on failure."""
+    cmd = [ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error"] + list(args)
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode("utf-8", errors="replace").strip())
+    return proc
+
+
+def probe_streams(path):
+    """
+    Reads the stream parameters that have to match for a stream-copy concat
+    (codecs, pixel format, size, fps, audio rate/layout) from ffmpeg's banner.
+    """
+    proc = subprocess.run([ffmpeg_binary(), "-hide_banner", "-i", path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return parse_stream_info(proc.stderr.decode("utf-8", errors="replace"))
+
+
+def parse_stream_info(info):
+    """Stream parameters from ffmpeg's "-i" banner text (see probe_streams)."""
+    params = {}
+    video = re.search(r"Stream #\d+:\d+.*?: Video: (.*)", info)
+    if video:
+        # Drop the parenthesized details first: they can hold commas ("yuvj444p(pc, bt470bg/unknown/unknown)")
+        # and hex tags that look like sizes ("(avc1 / 0x31637661)")
+        fields = [f.strip() for f in re.sub(r"\([^()]*\)", "", video.group(1)).split(",")]
+        params['video_codec'] = fields[0].split()[0]
+        if len(fields) > 1 and not re.match(r"\d+x\d+", fields[1]):
+            params['pix_fmt'] = fields[1].split()[0]
+        size = re.search(r"\b(\d+)x(\d+)\b", ",".join(fields[1:]))
+        if size:
+            params['size'] = (int(size.group(1)), int(size.group(2)))
+    fps = re.search(r"([\d.]+) fps", info)
+    if fps:
+        params['fps'] = float(fps.group(1))
+    audio = re.search(r"Stream #\d+:\d+.*?: Audio: (\w+)[^,]*, (\d+) Hz, ([\w.()]+)", info)
+    if audio:
+        params['audio_codec'] = audio.group(1)
+        params['sample_rate'] = int(audio.group(2))
+        params['channels'] = audio.group(3)
+    return params
+
+
+def probe_duration(path):
+    """Container duration in seconds, or None if ffmpeg can't read it."""
+    proc = subprocess.run([ffmpeg_binary(), "-hide_banner", "-i", path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    match = re.search(r"Duration: (\d+):(\d+):([\d.]+)", proc.stderr.decode("utf-8", errors="replace"))
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+IMAGE_CODECS = ("mjpeg", "png", "webp", "bmp", "tiff")
+
+def is_still_image(path):
+    """True for stills, including the image fallback's JPEGs saved under .mp4 names."""
+    if path.lower().endswith(('.jpg', '.jpeg', '.png')):
+        return True
+    return probe_streams(path).get('video_codec') in IMAGE_CODECS
+
+
+def can_stream_copy(paths):
+    """True if every file has the same codecs, size, fps and audio layout."""
+    if not paths:
+        return False
+    first = probe_streams(paths[0])
+    if 'video_codec' not in first:
+        return False
+    return all(probe_streams(p) == first for p in paths[1:])
+
+
+def concat_stream_copy(paths, output_path):
+    """Joins files with ffmpeg's concat demuxer without re-encoding. Returns True on success."""
+    list_path = f"{output_path}.concat.txt"
+    try:
+        with open(list_path, "w", encoding="utf-8") as f:
+            for p in paths:
+                escaped = os.path.abspath(p).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", "-movflags", "+faststart", output_path])
+        return True
+    except (RuntimeError, OSError) as e:
+        print(f"Stream-copy concat failed: {e}")
+        return False
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+
+def mix_background_music(video_path, music_path, output_path, volume=0.12, duck=False):
+    """
+    Audio-only post pass: loops/trims the music bed to the video, optionally ducks it
+    under the voiceover (sidechain compression), mixes it in, and remuxes with the
+    video stream copied as-is.
+    """
+    bed = f"[1:a]aformat=sample_rates=44100:channel_layouts=stereo,volume={volume}[bg]"
+    voice = "[0:a]aformat=sample_rates=44100:channel_layouts=stereo"
+    # amix halves each input; volume=2 restores the voiceover level
+    mix = "amix=inputs=2:duration=first:dropout_transition=0,volume=2[aout]"
+    if duck:
+        graph = f"{bed};{voice},asplit=2[voice][sc];[bg][sc]sidechaincompress=threshold=0.05:ratio=8:attack=20:release=300[ducked];[voice][ducked]{mix}"
+    else:
+        graph = f"{bed};{voice}[voice];[voice][bg]{mix}"
+
+    run_ffmpeg([
+        "-i", video_path,
+        "-stream_loop", "-1", "-i", music_path,
+        "-filter_complex", graph,
+        "-map", "0:v", "-map", "[aout]",
+        "-c:v", "copy",
+        "-c:a", "aac",
+        "-movflags", "+faststart",
+        output_path
+    ])
+    return output_path
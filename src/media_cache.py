@@ -0,0 +1,388 @@
+import os
+import json
+import shutil
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Linux ioctl for copy-on-write clones (btrfs, xfs with reflink=1)
+FICLONE = 0x40049409
+
+# Scratch files untouched for this long were left behind by a crashed or abandoned writer
+STALE_TMP_SECONDS = float(os.getenv("MEDIA_CACHE_TMP_MAX_AGE", str(24 * 3600)))
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Returns the sha256 hex digest of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def link_or_copy(src, dest):
+    """
+    Materializes src at dest without duplicating data where the filesystem allows it:
+    hardlink first, then a reflink clone, then a plain copy.
+    dest is replaced atomically, so readers never see a half-written file.
+    """
+    tmp_dest = f"{dest}.{os.getpid()}.{threading.get_ident()}.link"
+    if os.path.exists(tmp_dest):
+        os.remove(tmp_dest)
+
+    try:
+        os.link(src, tmp_dest)
+    except OSError:
+        try:
+            import fcntl
+            with open(src, 'rb') as fsrc, open(tmp_dest, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except (OSError, ImportError):
+            shutil.copyfile(src, tmp_dest)
+
+    os.replace(tmp_dest, dest)
+
+
+class MediaCache:
+    """
+    Persistent content-addressed file cache.
+
+    Blobs live under objects/ named by the sha256 of their content. Callers look them up
+    by a key of their own (e.g. Pexels media id + rendition URL) through small ref files,
+    so identical content fetched under different keys is stored once.
+    Least recently used blobs are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, root=None, max_bytes=None, verify=None):
+        self.root = root or os.getenv("MEDIA_CACHE_DIR", os.path.join(".cache", "media"))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("MEDIA_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        # Full re-hash on every hit is expensive for large clips, so by default only sizes are checked
+        if verify is None:
+            verify = os.getenv("MEDIA_CACHE_VERIFY", "0").lower() in ("1", "true", "yes")
+        self.verify = verify
+
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.refs_dir = os.path.join(self.root, "refs")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        for d in (self.objects_dir, self.refs_dir, self.tmp_dir):
+            os.makedirs(d, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Running total of objects/, walked once on first store and kept up to date after that
+        self._size = None
+        self._sweep_tmp()
+
+    @staticmethod
+    def make_key(*parts):
+        raw = "\x1f".join("" if p is None else str(p) for p in parts)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _ref_path(self, key):
+        return os.path.join(self.refs_dir, key[:2], key)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def tmp_path(self, key):
+        """Scratch location on the cache filesystem for writing a new entry."""
+        return os.path.join(self.tmp_dir, f"{key}.{os.getpid()}.{threading.get_ident()}.part")
+
+    @contextmanager
+    def partial(self, key):
+        """
+        Yields the stable location for an in-progress download of key, kept across attempts
+        for resuming. An exclusive lock on it is held until the block exits, so processes
+        sharing the cache never write the same partial file at once. Without fcntl
+        (Windows) each process gets a partial file of its own instead.
+        """
+        path = os.path.join(self.tmp_dir, f"{key}.partial")
+        try:
+            import fcntl
+        except ImportError:
+            yield f"{path}.{os.getpid()}"
+            return
+
+        # Locks live on a separate file, so a waiter can't end up holding a lock on an inode
+        # that has already been moved into objects/
+        lock_path = f"{path}.lock"
+        while True:
+            lock = open(lock_path, 'a')
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.stat(lock_path).st_ino == os.fstat(lock.fileno()).st_ino:
+                    break
+            except OSError:
+                pass
+            # _sweep_tmp removed the lock file while we waited on it; lock the current one instead
+            lock.close()
+
+        with lock:
+            try:
+                # mtime tells _sweep_tmp when the lock was last used
+                os.utime(lock_path)
+                yield path
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _sweep_tmp(self, max_age=STALE_TMP_SECONDS):
+        """Removes scratch files and partial downloads nobody has touched for max_age seconds."""
+        cutoff = time.time() - max_age
+        try:
+            names = os.listdir(self.tmp_dir)
+        except OSError:
+            return
+
+        for name in names:
+            path = os.path.join(self.tmp_dir, name)
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                if not name.endswith(".lock"):
+                    os.remove(path)
+                    continue
+
+                import fcntl
+                with open(path, 'a') as lock:
+                    # Only remove a lock nobody holds; partial() re-checks the inode after locking
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    os.remove(path)
+            except (OSError, ImportError):
+                pass
+
+    def _drop(self, key):
+        try:
+            os.remove(self._ref_path(key))
+        except OSError:
+            pass
+
+    def lookup(self, key):
+        """Returns the cached blob path for key, or None if missing or corrupt."""
+        ref_path = self._ref_path(key)
+        try:
+            with open(ref_path, 'r') as f:
+                ref = json.load(f)
+        except OSError:
+            return None
+        except ValueError:
+            # Refs are replaced atomically, so unparsable JSON is corruption rather than a write in progress
+            self._drop(key)
+            return None
+
+        try:
+            digest, expected_size = ref['sha256'], ref['size']
+            obj_path = self._object_path(digest)
+        except (KeyError, TypeError):
+            # Truncated or hand-edited ref: treat it as a miss so the entry is fetched again
+            self._drop(key)
+            return None
+
+        try:
+            size = os.path.getsize(obj_path)
+        except OSError:
+            self._drop(key)
+            return None
+
+        if size != expected_size or (self.verify and file_digest(obj_path) != digest):
+            print(f"Cache entry {key[:12]} failed integrity check. Discarding.")
+            self._drop(key)
+            try:
+                os.remove(obj_path)
+                with self._lock:
+                    if self._size is not None:
+                        self._size -= size
+            except OSError:
+                pass
+            return None
+
+        # mtime doubles as the LRU clock
+        try:
+            os.utime(obj_path)
+        except OSError:
+            pass
+        return obj_path
+
+    def fetch(self, key, dest):
+        """Links the cached blob for key to dest. Returns False on a cache miss."""
+        obj_path = self.lookup(key)
+        if not obj_path:
+            return False
+        try:
+            link_or_copy(obj_path, dest)
+            return True
+        except OSError as e:
+            print(f"Cache fetch failed: {e}")
+            return False
+
+    def store(self, key, src_path):
+        """Moves src_path into the cache under key and returns the blob path."""
+        digest = file_digest(src_path)
+        size = os.path.getsize(src_path)
+        obj_path = self._object_path(digest)
+        os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+
+        if os.stat(src_path).st_dev != os.stat(self.tmp_dir).st_dev:
+            # src is on another filesystem (e.g. a tmpfs SCRATCH_ROOT), where os.replace fails
+            # with EXDEV: copy it onto the cache filesystem first so the move below is a rename
+            tmp_path = self.tmp_path(digest)
+            shutil.copyfile(src_path, tmp_path)
+            os.remove(src_path)
+            src_path = tmp_path
+
+        with self._lock:
+            if os.path.exists(obj_path) and os.path.getsize(obj_path) == size:
+                os.remove(src_path)
+            else:
+                replaced = os.path.getsize(obj_path) if os.path.exists(obj_path) else 0
+                os.replace(src_path, obj_path)
+                if self._size is not None:
+                    self._size += size - replaced
+
+            ref_path = self._ref_path(key)
+            os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+            tmp_ref = f"{ref_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_ref, 'w') as f:
+                json.dump({"sha256": digest, "size": size}, f)
+            os.replace(tmp_ref, ref_path)
+
+            self._evict(keep=obj_path)
+        return obj_path
+
+    def _scan(self):
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        return entries, total
+
+    def _evict(self, keep=None):
+        """
+        Removes least recently used blobs until the cache fits in max_bytes (called under the lock).
+        objects/ is only walked when the running total says the cap is exceeded; the walk also
+        picks up blobs other processes sharing the cache have added or removed.
+        """
+        if self._size is None:
+            _, self._size = self._scan()
+        if self._size <= self.max_bytes:
+            return
+
+        entries, total = self._scan()
+        if total <= self.max_bytes:
+            self._size = total
+            return
+
+        # Oldest first; refs pointing at evicted blobs are cleaned up lazily on lookup
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+
+class SearchCache:
+    """
+    TTL cache for API search responses with request coalescing.
+
+    Concurrent lookups of the same key share a single in-flight fetch instead of each
+    sending their own request. Up to max_entries are kept in memory, least recently used
+    first out, and, if disk_dir is set, also persisted as JSON so they survive restarts.
+    """
+
+    def __init__(self, ttl=None, disk_dir=None, max_entries=1024):
+        self.ttl = ttl if ttl is not None else float(os.getenv("PEXELS_SEARCH_TTL", "3600"))
+        self.disk_dir = disk_dir or os.getenv("PEXELS_SEARCH_CACHE_DIR")
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _disk_path(self, key):
+        digest = hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.json")
+
+    def _load_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires', 0) < time.time():
+            return None
+        return entry['expires'], entry['value']
+
+    def _save_disk(self, key, expires, value):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'expires': expires, 'value': value}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Search cache write failed: {e}")
+
+    def get_or_fetch(self, key, fetch):
+        """Returns the cached value for key, calling fetch() at most once across concurrent callers."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                return entry[1]
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                inflight = Future()
+                self._inflight[key] = inflight
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            return inflight.result()
+
+        try:
+            entry = self._load_disk(key)
+            if entry is None:
+                value = fetch()
+                entry = (time.time() + self.ttl, value)
+                self._save_disk(key, *entry)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.max_entries:
+                    now = time.time()
+                    self._entries = OrderedDict((k, v) for k, v in self._entries.items() if v[0] > now)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            inflight.set_result(entry[1])
+            return entry[1]
+        except BaseException as e:
+            inflight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
@@ -1,12 +1,109 @@
 import os
+import re
+import json
+import base64
+import time
 import requests
 import random
 import asyncio
+import weakref
+import threading
+from requests.adapters import HTTPAdapter
 import edge_tts
 from dotenv import load_dotenv
+from src.media_cache import MediaCache, SearchCache
+from src.tracing import tracer, traced
 
 load_dotenv()
 
+# Shared by every MediaFetcher in the process so sessions coalesce identical searches
+search_cache = SearchCache()
+
+# Service endpoints, overridable to point the fetch stage at local stand-ins
+# (see benchmarks/fake_services.py)
+PEXELS_API_BASE = os.getenv("PEXELS_API_BASE", "https://api.pexels.com").rstrip("/")
+PEXELS_FALLBACK_VIDEO_URL = os.getenv("PEXELS_FALLBACK_VIDEO_URL", "https://videos.pexels.com/video-files/856973/856973-hd_1080_1920_25fps.mp4")
+ELEVENLABS_API_BASE = os.getenv("ELEVENLABS_API_BASE", "https://api.elevenlabs.io").rstrip("/")
+# HTTP endpoint that returns Edge TTS stream chunks as JSON lines instead of the real service
+EDGE_TTS_ENDPOINT = os.getenv("EDGE_TTS_ENDPOINT")
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = (10, 60) # (connect, read) seconds
+DOWNLOAD_RETRIES = 3
+# Statuses that mean "try again later" rather than "this URL is bad"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def _make_session():
+    # Keep-alive connection pool sized for the concurrent fetch pipeline
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+http_session = _make_session()
+# Per cache key, so concurrent scenes fetching the same clip download it once.
+# Held weakly: a key's lock goes away once no download is using it
+download_locks = weakref.WeakValueDictionary()
+download_locks_guard = threading.Lock()
+
+# Output frame for each Pexels orientation (matches VideoEditor's canvas)
+TARGET_SIZES = {
+    "portrait": (1080, 1920),
+    "landscape": (1920, 1080),
+    "square": (1080, 1080),
+}
+
+def _retry_delay(attempt, response=None):
+    """Exponential backoff, or the server's Retry-After (in seconds) when it sends one."""
+    retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+    if retry_after.isdigit():
+        return min(int(retry_after), 30)
+    return 2 ** attempt
+
+def _download_lock(key):
+    with download_locks_guard:
+        lock = download_locks.get(key)
+        if lock is None:
+            lock = download_locks[key] = threading.Lock()
+        return lock
+
+def select_rendition(video_files, target_size):
+    """
+    Smallest Pexels rendition that still covers target_size without upscaling.
+    Falls back to the largest one if none is big enough.
+    """
+    target_w, target_h = target_size
+    candidates = [f for f in video_files if f.get('width') and f.get('height') and f.get('link')]
+    if not candidates:
+        return None
+
+    area = lambda f: f['width'] * f['height']
+    covering = [f for f in candidates if f['width'] >= target_w and f['height'] >= target_h]
+    if covering:
+        return min(covering, key=area)
+    return max(candidates, key=area)
+
+def _range_start(response):
+    """First byte offset of a 206 response's Content-Range, or None."""
+    match = re.match(r"bytes (\d+)-\d+/", response.headers.get("Content-Range", ""))
+    return int(match.group(1)) if match else None
+
+def _range_total(response):
+    """Full file size from a Content-Range header ("bytes 0-99/1000" or "bytes */1000"), or None."""
+    total = response.headers.get("Content-Range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+def _expected_size(response):
+    """Size the file should have once the body has been written, or None if the server didn't say."""
+    if response.status_code == 206:
+        return _range_total(response)
+    # requests decodes gzip/deflate bodies, so Content-Length only counts for identity transfers
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    length = response.headers.get("Content-Length", "")
+    return int(length) if length.isdigit() else None
+
 class MediaFetcher:
     def __init__(self):
         self.pexels_key = os.getenv("PEXELS_API_KEY")
@@ -15,78 +112,217 @@ class MediaFetcher:
     def __init__(self):
         self.pexels_key = os.getenv("PEXELS_API_KEY")
         self.elevenlabs_key = os.getenv("ELEVENLABS_API_KEY")
+        self.media_cache = MediaCache()
+        self.tts_cache = MediaCache(
+            root=os.getenv("TTS_CACHE_DIR", os.path.join(".cache", "tts")),
+            max_bytes=int(float(os.getenv("TTS_CACHE_MAX_MB", "256")) * 1024 * 1024)
+        )
+        self.download_stats = []
 
-    def search_media(self, query, media_type="video", per_page=5, orientation="portrait"):
-        """Search Pexels for videos or photos."""
+    @traced("search_media")
+    def search_media(self, query, media_type="video", per_page=5, orientation="portrait", target_size=None):
+        """
+        Search Pexels for videos or photos.
+        For videos, picks the smallest rendition that still covers target_size (defaults to
+        the output frame for the orientation) and reports its size, fps and file size.
+        """
         if not self.pexels_key:
             return []
 
+        target_size = target_size or TARGET_SIZES.get(orientation, TARGET_SIZES["portrait"])
         headers = {"Authorization": self.pexels_key}
         if media_type == "video":
-            url = f"https://api.pexels.com/videos/search?query={query}&per_page={per_page}&orientation={orientation}"
+            url = f"{PEXELS_API_BASE}/videos/search?query={query}&per_page={per_page}&orientation={orientation}"
         else:
-            url = f"https://api.pexels.com/v1/search?query={query}&per_page={per_page}&orientation={orientation}"
+            url = f"{PEXELS_API_BASE}/v1/search?query={query}&per_page={per_page}&orientation={orientation}"
+
+        def fetch():
+            response = http_session.get(url, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+            response.raise_for_status()
+            return response.json()
 
         try:
-            response = requests.get(url, headers=headers)
-            data = response.json()
+            data = search_cache.get_or_fetch((query, media_type, per_page, orientation), fetch)
             
             results = []
             if media_type == "video":
                 for item in data.get('videos', []):
-                    # Get best quality video file
-                    video_files = item.get('video_files', [])
-                    if not video_files: continue
-                    best = max(video_files, key=lambda x: x.get('width', 0) * x.get('height', 0))
+                    rendition = select_rendition(item.get('video_files', []), target_size)
+                    if not rendition: continue
                     results.append({
                         'type': 'video',
                         'id': item.get('id'),
-                        'url': best.get('link'),
+                        'url': rendition.get('link'),
+                        'width': rendition.get('width'),
+                        'height': rendition.get('height'),
+                        'fps': rendition.get('fps'),
+                        'file_size': rendition.get('size'),
                         'preview': item.get('image') # Thumbnail
                     })
             else:
+                 target_w, target_h = target_size
                  for item in data.get('photos', []):
+                    # Let the Pexels image CDN crop/scale to the output frame instead of sending the original
+                    original = item.get('src', {}).get('original')
                     results.append({
                         'type': 'image',
                         'id': item.get('id'),
-                        'url': item.get('src', {}).get('original'),
+                        'url': f"{original}?auto=compress&cs=tinysrgb&fit=crop&w={target_w}&h={target_h}" if original else None,
+                        'width': target_w,
+                        'height': target_h,
                         'preview': item.get('src', {}).get('medium')
                     })
             return results
         except Exception as e:
             print(f"Error searching media: {e}")
+            tracer.fail(e)
             return []
 
-    def download_url(self, url, filename):
-        try:
-            print(f"Downloading from {url}...")
-            r = requests.get(url)
-            with open(filename, 'wb') as f:
-                f.write(r.content)
-            return True
-        except Exception as e:
-            print(f"Download failed: {e}")
-            return False
+    def _stream_to_file(self, url, part_path, stats):
+        """
+        Streams url into part_path in chunks. If part_path already holds the start of the
+        file (an earlier interrupted transfer), the download resumes with an HTTP Range request.
+        The result is checked against the size the server announced, and a short file is
+        resumed again instead of being returned.
+        """
+        for attempt in range(DOWNLOAD_RETRIES):
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                with http_session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                    if offset and r.status_code == 416:
+                        # Nothing left to fetch if the partial file is already complete
+                        if _range_total(r) == offset:
+                            return
+                        os.remove(part_path)
+                        raise requests.ConnectionError(f"Partial file ({offset} bytes) doesn't match the remote file")
+                    r.raise_for_status()
+
+                    if offset and r.status_code == 206:
+                        if _range_start(r) != offset:
+                            os.remove(part_path)
+                            raise requests.ConnectionError("Server answered a different range. Restarting the download")
+                        mode = 'ab'
+                        stats['resumed_from'] = offset
+                    else:
+                        # Server ignored the Range header, start over
+                        mode = 'wb'
+                    expected = _expected_size(r)
+
+                    if stats['ttfb'] is None:
+                        stats['ttfb'] = time.perf_counter() - stats['started']
+
+                    with open(part_path, mode) as f:
+                        for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                            stats['bytes'] += len(chunk)
+
+                size = os.path.getsize(part_path)
+                if expected is not None and size != expected:
+                    if size > expected:
+                        os.remove(part_path)
+                    raise requests.ConnectionError(f"Incomplete download: {size} of {expected} bytes")
+                return
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code not in RETRY_STATUSES or attempt == DOWNLOAD_RETRIES - 1:
+                    raise
+                # Rate limited or a server hiccup: the partial data is still good
+                print(f"Server busy (HTTP {e.response.status_code}). Retrying...")
+                time.sleep(_retry_delay(attempt, e.response))
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == DOWNLOAD_RETRIES - 1:
+                    raise
+                print(f"Download interrupted ({e}). Resuming...")
+                time.sleep(_retry_delay(attempt))
+
+    def download_url(self, url, filename, media_id=None):
+        # Same Pexels media + rendition URL -> same bytes, so serve repeats from the cache
+        cache_key = self.media_cache.make_key("pexels", media_id, url)
+        stats = {'url': url, 'bytes': 0, 'cache_hit': False, 'resumed_from': 0,
+                 'ttfb': None, 'started': time.perf_counter()}
+
+        # One download per key at a time, so concurrent scenes wait for the first one and hit the cache.
+        # The partial file's lock extends that to other processes sharing the cache (e.g. a batch run);
+        # its name is stable per key so an interrupted transfer can be resumed on the next attempt.
+        # The local reference keeps the lock alive for as long as this download holds it
+        lock = _download_lock(cache_key)
+        with lock, self.media_cache.partial(cache_key) as part_path:
+            if self.media_cache.fetch(cache_key, filename):
+                print(f"Cache hit for {url}")
+                stats['cache_hit'] = True
+                self._record_download(stats)
+                return True
+
+            try:
+                print(f"Downloading from {url}...")
+                self._stream_to_file(url, part_path, stats)
+                self.media_cache.store(cache_key, part_path)
+                ok = self.media_cache.fetch(cache_key, filename)
+            except Exception as e:
+                print(f"Download failed: {e}")
+                stats['error'] = type(e).__name__
+                if (isinstance(e, requests.HTTPError) and e.response is not None
+                        and e.response.status_code not in RETRY_STATUSES and os.path.exists(part_path)):
+                    # Bad URL or auth: the partial data is useless. After 5xx/429 it is kept for the next attempt
+                    os.remove(part_path)
+                ok = False
+
+        self._record_download(stats)
+        return ok
 
-    def download_video(self, query, duration, filename, orientation="portrait"):
+    def _record_download(self, stats):
+        stats['seconds'] = time.perf_counter() - stats.pop('started')
+        stats['throughput_mbps'] = (stats['bytes'] * 8 / 1e6 / stats['seconds']) if stats['seconds'] > 0 else 0.0
+        self.download_stats.append(stats)
+        tracer.record("download_url", stats['seconds'], bytes=stats['bytes'], error=stats.get('error'),
+                      cache_hit=stats['cache_hit'], resumed=bool(stats['resumed_from']))
+
+    def download_summary(self):
+        """Aggregate throughput/latency over every download this fetcher has made."""
+        transfers = [s for s in self.download_stats if not s['cache_hit']]
+        total_bytes = sum(s['bytes'] for s in transfers)
+        total_seconds = sum(s['seconds'] for s in transfers)
+        ttfbs = sorted(s['ttfb'] for s in transfers if s['ttfb'] is not None)
+        return {
+            'downloads': len(transfers),
+            'failed': sum(1 for s in transfers if s.get('error')),
+            'resumed': sum(1 for s in transfers if s['resumed_from']),
+            'cache_hits': len(self.download_stats) - len(transfers),
+            'bytes': total_bytes,
+            'seconds': total_seconds,
+            'throughput_mbps': (total_bytes * 8 / 1e6 / total_seconds) if total_seconds > 0 else 0.0,
+            'median_ttfb': ttfbs[len(ttfbs) // 2] if ttfbs else None,
+        }
+
+    @staticmethod
+    def _pick(results, query):
+        """
+        Picks a search result, varied by query but the same on every fetch of that query, so
+        re-fetching after a Script Doctor edit keeps the footage (and the scene cache keys)
+        of scenes whose keyword didn't change.
+        """
+        return random.Random(query).choice(results)
+
+    def download_video(self, query, duration, filename, orientation="portrait", target_size=None):
         # 1. Try Videos
-        videos = self.search_media(query, "video", orientation=orientation)
+        videos = self.search_media(query, "video", orientation=orientation, target_size=target_size)
         if videos:
-            selected = random.choice(videos)
-            return self.download_url(selected['url'], filename)
+            selected = self._pick(videos, query)
+            print(f"Selected {selected['width']}x{selected['height']} @ {selected['fps']} fps rendition for '{query}'")
+            return self.download_url(selected['url'], filename, media_id=selected['id'])
         
         # 2. Fallback to Images (Ken Burns)
         print(f"No videos found for {query}. Searching images...")
-        images = self.search_media(query, "image", orientation=orientation)
+        images = self.search_media(query, "image", orientation=orientation, target_size=target_size)
         if images:
-            selected = random.choice(images)
+            selected = self._pick(images, query)
             # Change extension to jpg if needed, but filename usually passed as .mp4
             # If filename is .mp4, we should probably save as .jpg and ensure VideoEditor handles it.
             # But the caller expects 'filename'.
             # If we write JPG bytes to a file named .mp4, MoviePy might get confused or FFmpeg might handle it.
             # Safest: change extension.
             real_filename = filename.replace(".mp4", ".jpg") 
-            if self.download_url(selected['url'], real_filename):
+            if self.download_url(selected['url'], real_filename, media_id=selected['id']):
                 # Update filename variable (BUT we can't update caller's string)
                 # We need to handle this.
                 # Hack: Write to the original filename too? bad idea.
@@ -123,64 +359,161 @@ class MediaFetcher:
             # The 'Ken Burns' feature relies on Images.
             # I will attempt request to photos, save as the filename (even if .mp4).
             # VideoEditor: I will update it to "try ImageClip" if VideoFileClip errors.
-            return self.download_url(selected['url'], filename)
+            return self.download_url(selected['url'], filename, media_id=selected['id'])
             
         return self.download_fallback_video(filename)
 
     def download_fallback_video(self, filename):
         """Downloads a default abstract background if Pexels fails."""
         print("Using fallback video...")
-        fallback_url = "https://videos.pexels.com/video-files/856973/856973-hd_1080_1920_25fps.mp4" 
-        return self.download_url(fallback_url, filename)
+        return self.download_url(PEXELS_FALLBACK_VIDEO_URL, filename, media_id=856973)
+
+    def _tts_key(self, text, voice, provider, settings=None):
+        # Whitespace-only edits in the Script Doctor shouldn't cause a re-synthesis
+        normalized = " ".join(text.split())
+        return self.tts_cache.make_key("tts", provider, voice, json.dumps(settings or {}, sort_keys=True), normalized)
+
+    def _store_tts(self, cache_key, tmp_path, filename):
+        try:
+            self.tts_cache.store(cache_key, tmp_path)
+            return self.tts_cache.fetch(cache_key, filename)
+        except OSError as e:
+            print(f"TTS cache write failed: {e}")
+            os.replace(tmp_path, filename)
+            return True
+
+    def tts_provider(self, provider):
+        """The provider generate_audio actually uses: ElevenLabs needs an API key, otherwise Edge TTS."""
+        return "elevenlabs" if provider == "elevenlabs" and self.elevenlabs_key else "edge"
 
     async def generate_audio(self, text, filename, voice="en-US-ChristopherNeural", provider="edge"):
-        if provider == "elevenlabs" and self.elevenlabs_key:
+        if self.tts_provider(provider) == "elevenlabs":
             return self.generate_audio_elevenlabs(text, filename)
+
+        return await self.generate_audio_with_timings(text, filename, voice) is not None
+
+    async def _edge_chunks(self, text, voice):
+        """Edge TTS stream chunks, or the same chunks from EDGE_TTS_ENDPOINT when it is set."""
+        if EDGE_TTS_ENDPOINT:
+            response = await asyncio.to_thread(
+                http_session.post, EDGE_TTS_ENDPOINT, json={"text": text, "voice": voice}, timeout=DOWNLOAD_TIMEOUT
+            )
+            response.raise_for_status()
+            for line in response.text.splitlines():
+                chunk = json.loads(line)
+                if chunk["type"] == "audio":
+                    chunk["data"] = base64.b64decode(chunk["data"])
+                yield chunk
+            return
+
+        try:
+            communicate = edge_tts.Communicate(text, voice, boundary="WordBoundary")
+        except TypeError:
+            # edge-tts < 7 has no boundary option and always emits WordBoundary events
+            communicate = edge_tts.Communicate(text, voice)
+        async for chunk in communicate.stream():
+            yield chunk
+
+    async def _stream_edge(self, text, voice, audio_path):
+        """Synthesizes with Edge TTS, collecting WordBoundary events while the audio streams in."""
+        words = []
+        with open(audio_path, 'wb') as f:
+            async for chunk in self._edge_chunks(text, voice):
+                if chunk["type"] == "audio":
+                    f.write(chunk["data"])
+                elif chunk["type"] == "WordBoundary":
+                    # Offsets are in 100ns ticks; leading space matches faster-whisper's word format
+                    start = chunk["offset"] / 1e7
+                    words.append({
+                        "word": f" {chunk['text']}",
+                        "start": start,
+                        "end": start + chunk["duration"] / 1e7
+                    })
+        return words
+
+    @traced("generate_audio", output_arg="filename", provider="edge")
+    async def generate_audio_with_timings(self, text, filename, voice="en-US-ChristopherNeural"):
+        """
+        Edge TTS synthesis that also returns word-level timestamps in the same format as
+        SubtitleGenerator.generate_subtitles, so the audio doesn't need to be transcribed.
+        Returns None on failure, or an empty list if no timings are available.
+        """
+        cache_key = self._tts_key(text, voice, "edge")
+        words_key = self.tts_cache.make_key(cache_key, "words")
+        if self.tts_cache.fetch(cache_key, filename):
+            print("Audio cache hit (EdgeTTS)")
+            words_path = self.tts_cache.lookup(words_key)
+            if words_path:
+                with open(words_path, 'r') as f:
+                    return json.load(f)
+            return []
             
         # Default Edge TTS
+        tmp_path = self.tts_cache.tmp_path(cache_key)
         for attempt in range(3):
             try:
                 print(f"Generating audio (EdgeTTS)...")
-                communicate = edge_tts.Communicate(text, voice)
-                await asyncio.wait_for(communicate.save(filename), timeout=30)
-                return True
+                words = await asyncio.wait_for(self._stream_edge(text, voice, tmp_path), timeout=30)
+                if not self._store_tts(cache_key, tmp_path, filename):
+                    return None
+                if words:
+                    words_tmp = self.tts_cache.tmp_path(words_key)
+                    with open(words_tmp, 'w') as f:
+                        json.dump(words, f)
+                    self.tts_cache.store(words_key, words_tmp)
+                return words
             except Exception as e:
                 print(f"EdgeTTS Error: {e}")
+                error = e
                 await asyncio.sleep(1)
-        return False
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        tracer.fail(error)
+        return None
 
+    @traced("generate_audio", output_arg="filename", provider="elevenlabs")
     def generate_audio_elevenlabs(self, text, filename):
-        print("Generating audio (ElevenLabs)...")
         # Adam Voice ID: pMsXgWXvGLBEC91PjDqh (Legacy default) or similar.
         # Use a stable ID.
         voice_id = "21m00Tcm4TlvDq8ikWAM" # Rachel (common default) or similar.
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+        url = f"{ELEVENLABS_API_BASE}/v1/text-to-speech/{voice_id}"
         
         headers = {
             "xi-api-key": self.elevenlabs_key,
             "Content-Type": "application/json"
         }
         
+        model_id = "eleven_monolingual_v1"
+        voice_settings = {
+            "stability": 0.5,
+            "similarity_boost": 0.5
+        }
         payload = {
             "text": text,
-            "model_id": "eleven_monolingual_v1",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.5
-            }
+            "model_id": model_id,
+            "voice_settings": voice_settings
         }
-        
+
+        cache_key = self._tts_key(text, voice_id, "elevenlabs", {"model_id": model_id, **voice_settings})
+        if self.tts_cache.fetch(cache_key, filename):
+            print("Audio cache hit (ElevenLabs)")
+            return True
+
+        print("Generating audio (ElevenLabs)...")
         try:
-            response = requests.post(url, json=payload, headers=headers)
+            response = http_session.post(url, json=payload, headers=headers, timeout=DOWNLOAD_TIMEOUT)
             if response.status_code == 200:
-                with open(filename, 'wb') as f:
+                tmp_path = self.tts_cache.tmp_path(cache_key)
+                with open(tmp_path, 'wb') as f:
                     f.write(response.content)
-                return True
+                return self._store_tts(cache_key, tmp_path, filename)
             else:
                 print(f"ElevenLabs Error: {response.text}")
+                tracer.fail(f"HTTP {response.status_code}")
                 return False
         except Exception as e:
             print(f"ElevenLabs Exception: {e}")
+            tracer.fail(e)
             return False
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+import os
+from src.media_cache import MediaCache, file_digest
+from src.ffmpeg_tools import run_ffmpeg, is_still_image
+
+PROXY_FPS = 24
+# Extra resolution over the canvas for Ken Burns renders: the 1 + 0.02 * t zoom then
+# crops into real pixels instead of upscaling, for scenes up to ~7.5 s
+KEN_BURNS_HEADROOM = 1.15
+# Bump when the encode settings below change so stale proxies aren't reused
+PROXY_VERSION = 1
+
+
+class ProxyBuilder:
+    """
+    Ingest stage for fetched footage: transcodes each clip once with ffmpeg into a proxy
+    that is already at the output canvas size and 24 fps, with short GOPs and no B-frames,
+    so renders never have to decode 4K sources or scale/crop frames in Python.
+    The proxy is KEN_BURNS_HEADROOM larger than the canvas by default, so Ken Burns can
+    still be switched on after ingest without the zoom upscaling it.
+    Proxies are cached by source content + target, so they are reused across jobs.
+    """
+
+    def __init__(self, cache=None, headroom=KEN_BURNS_HEADROOM):
+        self.headroom = headroom
+        self.cache = cache or MediaCache(
+            root=os.getenv("PROXY_CACHE_DIR", os.path.join(".cache", "proxies")),
+            max_bytes=int(float(os.getenv("PROXY_CACHE_MAX_MB", "4096")) * 1024 * 1024)
+        )
+
+    def make_proxy(self, src_path, dest_path, target_size):
+        """Writes a proxy of src_path to dest_path and returns dest_path. Raises on ffmpeg errors."""
+        target_w, target_h = (int(side * self.headroom) // 2 * 2 for side in target_size)
+        cache_key = self.cache.make_key("proxy", PROXY_VERSION, file_digest(src_path), target_w, target_h, PROXY_FPS)
+        if self.cache.fetch(cache_key, dest_path):
+            print(f"Proxy cache hit for {src_path}")
+            return dest_path
+
+        # The image fallback saves stills under .mp4 names; turn them into a 10s still clip
+        input_args = []
+        if is_still_image(src_path):
+            input_args = ["-loop", "1", "-t", "10"]
+
+        print(f"Building proxy for {src_path}...")
+        tmp_path = self.cache.tmp_path(cache_key)
+        try:
+            run_ffmpeg(input_args + [
+                "-i", src_path,
+                "-an",
+                "-vf", (f"scale={target_w}:{target_h}:force_original_aspect_ratio=increase,"
+                        f"crop={target_w}:{target_h},fps={PROXY_FPS},setsar=1"),
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
+                # Keyframe every second and no B-frames: cheap seeks when scenes loop
+                "-g", str(PROXY_FPS), "-bf", "0",
+                "-pix_fmt", "yuv420p",
+                "-movflags", "+faststart",
+                "-f", "mp4", tmp_path
+            ])
+            self.cache.store(cache_key, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        if not self.cache.fetch(cache_key, dest_path):
+            raise RuntimeError(f"Proxy for {src_path} was evicted before use")
+        return dest_path
+
+    def refit(self, scene_assets, target_size):
+        """
+        Rebuilds, from the original downloads, the proxies of scene_assets that were made for
+        another canvas (the output format was changed after the assets were fetched) and
+        returns the updated assets. Scenes without a proxy or source are left as they are;
+        if a rebuild fails the old proxy is kept and cover_zoom crops it to the canvas.
+        """
+        target_size = tuple(target_size)
+        refitted = []
+        for asset in scene_assets:
+            source = asset.get('source')
+            if not asset.get('proxy_size') or tuple(asset['proxy_size']) == target_size or not source or not os.path.exists(source):
+                refitted.append(asset)
+                continue
+            root, ext = os.path.splitext(source)
+            try:
+                proxy_path = self.make_proxy(source, f"{root}.proxy_{target_size[0]}x{target_size[1]}{ext}", target_size)
+                asset = dict(asset, video=proxy_path, proxy_size=target_size)
+            except RuntimeError as e:
+                print(f"Proxy rebuild failed for {source}: {e}")
+            refitted.append(asset)
+        return refitted
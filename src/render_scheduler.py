@@ -0,0 +1,198 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+import traceback
+import uuid
+from src.video_editor import VideoEditor, voice_master_path
+from src.workspace import get_workspace_manager
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Lower runs first: quick previews go ahead of queued final renders
+PREVIEW_PRIORITY = -1
+
+
+class RenderJob:
+    """State of one queued render, updated by the scheduler's worker thread and read by the UI."""
+
+    def __init__(self, job_id, priority, render_args, font_path, workspace=None, owns_output=False):
+        self.id = job_id
+        self.priority = priority
+        self.render_args = render_args
+        self.font_path = font_path
+        self.workspace = workspace
+        # True when the scheduler picked the output path, so it also removes the file
+        self.owns_output = owns_output
+        self.status = QUEUED
+        self.stage = None
+        self.done = 0
+        self.total = len(render_args['scene_assets'])
+        self.result = None
+        self.error = None
+        self.failed_scenes = []
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def _update(self, stage, idx, done, total):
+        self.stage = stage
+        if self.workspace:
+            self.workspace.touch()
+        if stage == "scene":
+            self.done, self.total = done, total
+
+    def snapshot(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'done': self.done,
+            'total': self.total,
+            'result': self.result,
+            'error': self.error,
+            'failed_scenes': list(self.failed_scenes),
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class RenderScheduler:
+    """
+    Process-wide render queue shared by every Streamlit session.
+    Jobs wait in a priority queue (lower value first, FIFO within a priority) and at most
+    `max_concurrent` run at once on background threads, each with its share of the CPU
+    for scene workers. Finished jobs are kept for `keep_seconds` so a refreshed page
+    can pick its result back up by job id; after that, outputs the scheduler placed in
+    OUTPUT_DIR are deleted with them.
+    """
+
+    def __init__(self, max_concurrent=None, keep_seconds=None):
+        self.max_concurrent = max_concurrent or int(os.getenv("RENDER_CONCURRENCY", "1"))
+        self.keep_seconds = keep_seconds or int(os.getenv("RENDER_JOB_TTL", "3600"))
+        self._queue = [] # (priority, seq, job_id)
+        self._seq = itertools.count()
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._threads = []
+        for i in range(self.max_concurrent):
+            thread = threading.Thread(target=self._worker, name=f"render-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, scene_assets, output_path=None, font_path="fonts/Montserrat-Black.ttf", priority=0, workspace=None, **render_kwargs):
+        """
+        Queues a create_shorts call and returns its job id.
+        output_path defaults to <OUTPUT_DIR>/<job id>.mp4, removed when the job expires.
+        The render's scratch files go to `workspace` (the one holding the scene assets, if
+        given), which is removed when the job ends. render_kwargs are passed to
+        VideoEditor.create_shorts.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        owns_output = output_path is None
+        output_path = output_path or get_workspace_manager().output_path(job_id)
+        render_args = dict(render_kwargs, scene_assets=scene_assets, output_path=output_path)
+        if not render_args.get('workers'):
+            # Concurrent renders split the cores instead of each taking all of them
+            render_args['workers'] = max(1, (os.cpu_count() or 1) // self.max_concurrent)
+        job = RenderJob(job_id, priority, render_args, font_path, workspace, owns_output)
+        with self._cond:
+            self._prune()
+            self._jobs[job_id] = job
+            heapq.heappush(self._queue, (priority, next(self._seq), job_id))
+            self._cond.notify()
+        return job_id
+
+    def get(self, job_id):
+        """Returns the job's status dict (plus its queue position), or None if unknown."""
+        with self._cond:
+            self._prune()
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = job.snapshot()
+            status['position'] = self._position(job_id)
+            return status
+
+    def _position(self, job_id):
+        # 1-based place in line among queued jobs, None once it has started
+        for position, (_, _, queued_id) in enumerate(sorted(self._queue), start=1):
+            if queued_id == job_id:
+                return position
+        return None
+
+    def cancel(self, job_id):
+        """Cancels a job that hasn't started yet. Returns True if it was removed from the queue."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return False
+            self._queue = [entry for entry in self._queue if entry[2] != job_id]
+            heapq.heapify(self._queue)
+            job.status = CANCELLED
+            job.finished = time.time()
+        if job.workspace:
+            job.workspace.cleanup()
+        return True
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_seconds
+        for job in [j for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+            del self._jobs[job.id]
+            if job.owns_output:
+                output_path = job.render_args['output_path']
+                for path in (output_path, voice_master_path(output_path)):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, job_id = heapq.heappop(self._queue)
+                job = self._jobs[job_id]
+                job.status = RUNNING
+                job.started = time.time()
+            self._run(job)
+
+    def _run(self, job):
+        editor = VideoEditor(font_path=job.font_path)
+        try:
+            # Private scratch dir so concurrent renders don't share temp scene files
+            job.workspace = job.workspace or get_workspace_manager().create(f"render-{job.id}")
+            job.workspace.check_quota()
+            work_dir = job.workspace.dir("render")
+            job.result = editor.create_shorts(on_progress=job._update, work_dir=work_dir, **job.render_args)
+            job.failed_scenes = editor.failed_scenes
+            job.status = DONE if job.result else FAILED
+            if not job.result:
+                job.error = "Render produced no output"
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            if job.workspace:
+                job.workspace.cleanup()
+            job.finished = time.time()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """The process-wide scheduler, started on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RenderScheduler()
+        return _scheduler
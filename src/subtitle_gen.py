@@ -1,12 +1,100 @@
 from faster_whisper import WhisperModel
+from faster_whisper.audio import decode_audio
+from contextlib import contextmanager
 import os
+import queue
+import bisect
+import threading
+import numpy as np
+from src.tracing import traced
+
+try:
+    # faster-whisper >= 1.1
+    from faster_whisper import BatchedInferencePipeline
+except ImportError:
+    BatchedInferencePipeline = None
+
+SAMPLE_RATE = 16000
+SCENE_GAP = 1.0 # Seconds of silence between scenes in a batch so words don't bleed across
+
+class ModelPool:
+    """
+    Lazily created WhisperModel instances shared by every SubtitleGenerator in the process.
+    Lives at module level, so it survives Streamlit reruns and is shared across user sessions.
+    """
+
+    def __init__(self, model_size="tiny", size=None):
+        self.model_size = model_size
+        self.size = size or int(os.getenv("WHISPER_POOL_SIZE", "1"))
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create(self):
+        print(f"Loading Whisper model ({self.model_size})...")
+        # Run on CPU to avoid complex CUDA setup requirements for the user
+        return WhisperModel(self.model_size, device="cpu", compute_type="int8")
+
+    def _reserve(self):
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return True
+            return False
+
+    def _load(self):
+        """Creates the model for a slot taken with _reserve(), giving the slot back if that fails."""
+        try:
+            return self._create()
+        except BaseException:
+            with self._lock:
+                self._created -= 1
+            # Wake a caller blocked in acquire() so it retries the load instead of waiting forever
+            self._idle.put(None)
+            raise
+
+    @contextmanager
+    def acquire(self):
+        """Borrows a model, loading a new one only if the pool isn't full yet."""
+        model = None
+        while model is None:
+            try:
+                model = self._idle.get_nowait()
+            except queue.Empty:
+                model = self._load() if self._reserve() else self._idle.get()
+        try:
+            yield model
+        finally:
+            self._idle.put(model)
+
+    def warm_up(self, count=None):
+        """Loads models ahead of time so the first job doesn't pay for it."""
+        for _ in range(min(count or self.size, self.size)):
+            if not self._reserve():
+                break
+            self._idle.put(self._load())
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_model_pool(model_size="tiny"):
+    with _pools_lock:
+        if model_size not in _pools:
+            _pools[model_size] = ModelPool(model_size)
+        return _pools[model_size]
+
+def warm_up(model_size="tiny", count=None):
+    """Server start hook: preload the shared Whisper models."""
+    get_model_pool(model_size).warm_up(count)
+
 
 class SubtitleGenerator:
     def __init__(self, model_size="tiny"):
         # "tiny" is fast and sufficient for clear TTS audio
-        # Run on CPU to avoid complex CUDA setup requirements for the user
-        self.model = WhisperModel(model_size, device="cpu", compute_type="int8")
+        self.pool = get_model_pool(model_size)
 
+    @traced("generate_subtitles")
     def generate_subtitles(self, audio_path):
         """
         Generates word-level timestamps for the given audio file.
@@ -22,19 +110,80 @@ class SubtitleGenerator:
              return []
 
         print("Transcribing audio for subtitles...")
-        segments, info = self.model.transcribe(audio_path, word_timestamps=True)
-        
         word_list = []
-        for segment in segments:
-            for word in segment.words:
-                word_list.append({
-                    "word": word.word,
-                    "start": word.start,
-                    "end": word.end
-                })
+        with self.pool.acquire() as model:
+            # Segments are generated lazily, so consume them while holding the model
+            segments, info = model.transcribe(audio_path, word_timestamps=True)
+            for segment in segments:
+                for word in segment.words:
+                    word_list.append({
+                        "word": word.word,
+                        "start": word.start,
+                        "end": word.end
+                    })
         
         return word_list
 
+    @traced("generate_subtitles_batch")
+    def generate_subtitles_batch(self, audio_paths, language="en", batch_size=8):
+        """
+        Transcribes all scene audio files of a job in one inference pass.
+        The clips are decoded and joined with short silences, transcribed once with the
+        language pinned (no detection pass), and the words are split back per scene.
+        Returns one word list per input path, with timestamps relative to that scene.
+        """
+        results = [[] for _ in audio_paths]
+        chunks = []
+        spans = [] # (scene_idx, start, end) in the joined timeline
+        cursor = 0.0
+        gap = np.zeros(int(SCENE_GAP * SAMPLE_RATE), dtype=np.float32)
+
+        for idx, audio_path in enumerate(audio_paths):
+            if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
+                print(f"Audio file missing or empty: {audio_path}")
+                continue
+            try:
+                audio = decode_audio(audio_path, sampling_rate=SAMPLE_RATE)
+            except Exception as e:
+                # One undecodable voiceover shouldn't cost every other scene its subtitles
+                print(f"Could not decode {audio_path}: {e}")
+                continue
+            duration = len(audio) / SAMPLE_RATE
+            spans.append((idx, cursor, cursor + duration))
+            chunks.extend([audio, gap])
+            cursor += duration + SCENE_GAP
+
+        if not spans:
+            return results
+
+        print(f"Transcribing {len(spans)} scenes in one batch...")
+        combined = np.concatenate(chunks)
+        span_starts = [start for _, start, _ in spans]
+
+        with self.pool.acquire() as model:
+            if BatchedInferencePipeline is not None:
+                batched = BatchedInferencePipeline(model=model)
+                segments, info = batched.transcribe(combined, language=language, word_timestamps=True, batch_size=batch_size)
+            else:
+                segments, info = model.transcribe(combined, language=language, word_timestamps=True)
+
+            for segment in segments:
+                for word in segment.words:
+                    # Assign each word to the scene its midpoint falls in
+                    mid = (word.start + word.end) / 2
+                    pos = max(bisect.bisect_right(span_starts, mid) - 1, 0)
+                    idx, start, end = spans[pos]
+                    if mid >= end:
+                        # Heard in the silence between scenes, so it belongs to neither
+                        continue
+                    results[idx].append({
+                        "word": word.word,
+                        "start": min(max(word.start - start, 0.0), end - start),
+                        "end": min(word.end - start, end - start)
+                    })
+
+        return results
+
 if __name__ == "__main__":
     # Test
     # Create a dummy audio first or ensure one exists
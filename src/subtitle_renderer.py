@@ -0,0 +1,131 @@
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+from PIL import Image, ImageDraw, ImageFont
+
+DEFAULT_FONT = "fonts/Montserrat-Black.ttf"
+
+
+class GlyphCache:
+    """
+    In-process subtitle rasterizer built on Pillow.
+    Rendered word sprites (RGBA numpy arrays) are memoized in a bounded LRU keyed by
+    (word, font, size, color, stroke), so a word that appears many times is drawn once.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.getenv("GLYPH_CACHE_SIZE", "2048"))
+        self._sprites = OrderedDict()
+        self._fonts = {}
+        self._lock = threading.Lock()
+
+    def _load_font(self, font, size):
+        key = (font, size)
+        if key not in self._fonts:
+            # "Arial" resolves on Windows; elsewhere fall back to the bundled font
+            for candidate in (font, DEFAULT_FONT):
+                try:
+                    self._fonts[key] = ImageFont.truetype(candidate, size)
+                    break
+                except OSError:
+                    continue
+            else:
+                print(f"Font {font} not found, using Pillow's default font.")
+                self._fonts[key] = ImageFont.load_default()
+        return self._fonts[key]
+
+    def render(self, word, font, size=80, color="white", stroke_color="black", stroke_width=2):
+        """Returns the word as an HxWx4 uint8 RGBA array, tightly cropped to its outline."""
+        key = (word, font, size, color, stroke_color, stroke_width)
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is not None:
+                self._sprites.move_to_end(key)
+                return sprite
+
+        font_obj = self._load_font(font, size)
+        left, top, right, bottom = ImageDraw.Draw(Image.new("RGBA", (1, 1))).textbbox(
+            (0, 0), word, font=font_obj, stroke_width=stroke_width
+        )
+        image = Image.new("RGBA", (max(right - left, 1), max(bottom - top, 1)), (0, 0, 0, 0))
+        ImageDraw.Draw(image).text(
+            (-left, -top), word, font=font_obj, fill=color,
+            stroke_width=stroke_width, stroke_fill=stroke_color
+        )
+        sprite = np.array(image)
+
+        with self._lock:
+            self._sprites[key] = sprite
+            while len(self._sprites) > self.max_entries:
+                self._sprites.popitem(last=False)
+        return sprite
+
+
+# One cache per process (each render worker keeps its own)
+glyph_cache = GlyphCache()
+
+
+class SubtitleOverlay:
+    """
+    Burns a scene's word timeline into frames as a single layer.
+    Start/end times are kept as sorted NumPy arrays, the active word for a frame is found
+    with a binary search, and only that sprite's bounding box is alpha-blended, so the
+    per-frame cost doesn't grow with the number of words in the scene.
+    """
+
+    def __init__(self, subtitles, frame_size, font, size=80, color="white", stroke_color="black", stroke_width=2, cache=None):
+        cache = cache or glyph_cache
+        frame_w, frame_h = frame_size
+
+        items = sorted(
+            (item['start'], item['end'], item['word'].strip())
+            for item in subtitles
+            if item['end'] > item['start'] and item['word'].strip()
+        )
+        self.starts = np.array([start for start, _, _ in items], dtype=np.float64)
+        self.ends = np.array([end for _, end, _ in items], dtype=np.float64)
+
+        # Precompute float RGB/alpha per unique word, centered and clipped to the frame
+        layers = {}
+        self.layers = []
+        for _, _, word in items:
+            if word not in layers:
+                sprite = cache.render(word, font, size, color, stroke_color, stroke_width)
+                h, w = sprite.shape[:2]
+                x0 = (frame_w - w) // 2
+                y0 = (frame_h - h) // 2
+                sx0, sy0 = max(-x0, 0), max(-y0, 0)
+                sx1, sy1 = min(w, frame_w - x0), min(h, frame_h - y0)
+                sprite = sprite[sy0:sy1, sx0:sx1]
+                alpha = sprite[:, :, 3:4].astype(np.float32) / 255.0
+                layers[word] = (
+                    max(y0, 0), max(y0, 0) + sprite.shape[0],
+                    max(x0, 0), max(x0, 0) + sprite.shape[1],
+                    sprite[:, :, :3].astype(np.float32) * alpha, # premultiplied
+                    1.0 - alpha
+                )
+            self.layers.append(layers[word])
+
+    def active_index(self, t):
+        idx = int(np.searchsorted(self.starts, t, side='right')) - 1
+        if idx < 0 or t >= self.ends[idx]:
+            return None
+        return idx
+
+    def apply(self, frame, t):
+        idx = self.active_index(t)
+        if idx is None:
+            return frame
+
+        y0, y1, x0, x1, rgb, inv_alpha = self.layers[idx]
+        # Readers may hand back their internal buffer (and repeat it for the next t),
+        # so blend into a copy rather than the decoder's frame
+        frame = frame.copy()
+        region = frame[y0:y1, x0:x1]
+        region[...] = (rgb + region * inv_alpha + 0.5).astype(np.uint8)
+        return frame
+
+    def apply_to(self, clip):
+        """Returns clip with the subtitles burned in."""
+        return clip.fl(lambda get_frame, t: self.apply(get_frame(t), t))
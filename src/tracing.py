@@ -0,0 +1,267 @@
+import os
+import sys
+import json
+import time
+import inspect
+import functools
+import statistics
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+
+def peak_rss_mb(who=None):
+    """
+    High-water mark of resident memory in MB for this process (or its largest finished
+    child process with who="children"), or None where getrusage isn't available.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if who == "children" else resource.RUSAGE_SELF)
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(usage.ru_maxrss / divisor, 1)
+
+
+# Attribute dict of the innermost open span, per thread / asyncio task
+_current_span = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Records timing spans for the pipeline stages (duration, bytes moved, peak RSS).
+    Spans are appended to a JSON-lines file (TRACE_FILE), aggregated for the Prometheus
+    text endpoint, and kept in a rolling per-stage history (seeded from the file at start)
+    that the UI's ETA is computed from. Once the file passes max_bytes it is rotated to
+    TRACE_FILE.1, replacing the previous rotation.
+    """
+
+    def __init__(self, path=None, history_size=None, max_bytes=None):
+        self.path = os.getenv("TRACE_FILE", os.path.join(".cache", "traces.jsonl")) if path is None else path
+        self.history_size = history_size or int(os.getenv("TRACE_HISTORY", "200"))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("TRACE_MAX_MB", "16")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._history = defaultdict(lambda: deque(maxlen=self.history_size))
+        self._totals = defaultdict(lambda: {'count': 0, 'errors': 0, 'seconds': 0.0, 'bytes': 0, 'peak_rss_mb': 0.0})
+        self._lock = threading.Lock()
+        self._history_loaded = False
+
+    def _load_history(self):
+        # Lazy (called under the lock), so render worker processes that import this never read the file
+        if self._history_loaded:
+            return
+        self._history_loaded = True
+        if not self.path:
+            return
+        # Only the tail is needed to fill the rolling windows; right after a rotation
+        # most of it is in the rotated file
+        budget = 4 * 1024 * 1024
+        lines = []
+        try:
+            for path in (self.path, f"{self.path}.1"):
+                if budget <= 0 or not os.path.exists(path):
+                    continue
+                with open(path, "rb") as f:
+                    offset = max(os.path.getsize(path) - budget, 0)
+                    f.seek(offset)
+                    data = f.read()
+                budget -= len(data)
+                tail = data.decode("utf-8", errors="replace").splitlines()
+                if offset:
+                    tail = tail[1:] # partial first line
+                lines = tail + lines
+        except OSError as e:
+            print(f"Could not read trace history: {e}")
+            return
+        for line in lines:
+            try:
+                span = json.loads(line)
+                self._history[span['name']].append(span)
+            except (ValueError, KeyError):
+                continue
+
+    def record(self, name, seconds, bytes=None, peak_rss_mb=None, error=None, **attrs):
+        """Records a finished span, e.g. one measured in a worker process."""
+        span = {'name': name, 'ts': time.time(), 'seconds': round(seconds, 4)}
+        if bytes is not None:
+            span['bytes'] = bytes
+        if peak_rss_mb is not None:
+            span['peak_rss_mb'] = peak_rss_mb
+        if error:
+            span['error'] = error
+        span.update(attrs)
+
+        with self._lock:
+            self._load_history()
+            totals = self._totals[name]
+            totals['count'] += 1
+            totals['seconds'] += seconds
+            totals['bytes'] += bytes or 0
+            totals['peak_rss_mb'] = max(totals['peak_rss_mb'], peak_rss_mb or 0.0)
+            if error:
+                totals['errors'] += 1
+            else:
+                self._history[name].append(span)
+            if self.path:
+                try:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(span, default=str) + "\n")
+                        size = f.tell()
+                    if self.max_bytes and size > self.max_bytes:
+                        os.replace(self.path, f"{self.path}.1")
+                except OSError as e:
+                    print(f"Trace write failed: {e}")
+        return span
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Times the block. Yields the span's attribute dict so the caller can add to it
+        (e.g. span['bytes'] = ...). Exceptions are recorded and re-raised; failures the
+        block handles itself are recorded with fail().
+        """
+        started = time.perf_counter()
+        error = None
+        token = _current_span.set(attrs)
+        try:
+            yield attrs
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            error = error or attrs.pop('error', None)
+            self.record(name, time.perf_counter() - started, peak_rss_mb=peak_rss_mb(),
+                        error=error, **attrs)
+
+    def annotate(self, **attrs):
+        """
+        Adds attributes to the innermost open span of this thread (or task), for code
+        wrapped by @traced that has no handle on its span. No-op outside a span.
+        """
+        span = _current_span.get()
+        if span is not None:
+            span.update(attrs)
+
+    def fail(self, error):
+        """
+        Marks the innermost open span of this thread (or task) as failed, for traced code
+        that catches its own errors and returns a fallback instead of raising.
+        """
+        self.annotate(error=error if isinstance(error, str) else type(error).__name__)
+
+    def estimate(self, name, units=1, unit_attr=None, default=None, **match):
+        """
+        Median duration for `units` of work from the recent `name` spans whose attributes
+        equal `match`. With unit_attr, each span's duration is first divided by that
+        attribute (e.g. seconds per scene). Falls back to default per unit.
+        """
+        with self._lock:
+            self._load_history()
+            spans = [s for s in self._history.get(name, ())
+                     if all(s.get(k) == v for k, v in match.items()) and (not unit_attr or s.get(unit_attr))]
+        if not spans:
+            return default * units if default is not None else None
+        samples = [s['seconds'] / s[unit_attr] if unit_attr else s['seconds'] for s in spans]
+        return statistics.median(samples) * units
+
+    def prometheus_text(self):
+        """Aggregated spans in the Prometheus text exposition format."""
+        with self._lock:
+            totals = {name: dict(t) for name, t in self._totals.items()}
+        lines = [
+            "# HELP shorts_span_seconds Time spent in a pipeline stage.",
+            "# TYPE shorts_span_seconds summary",
+        ]
+        for name, t in sorted(totals.items()):
+            lines.append(f'shorts_span_seconds_count{{span="{name}"}} {t["count"]}')
+            lines.append(f'shorts_span_seconds_sum{{span="{name}"}} {t["seconds"]:.4f}')
+        lines += ["# HELP shorts_span_errors_total Spans that ended in an exception.",
+                  "# TYPE shorts_span_errors_total counter"]
+        lines += [f'shorts_span_errors_total{{span="{name}"}} {t["errors"]}' for name, t in sorted(totals.items())]
+        lines += ["# HELP shorts_span_bytes_total Bytes downloaded or written by a pipeline stage.",
+                  "# TYPE shorts_span_bytes_total counter"]
+        lines += [f'shorts_span_bytes_total{{span="{name}"}} {t["bytes"]}' for name, t in sorted(totals.items())]
+        lines += ["# HELP shorts_span_peak_rss_bytes Highest peak RSS seen at the end of a stage.",
+                  "# TYPE shorts_span_peak_rss_bytes gauge"]
+        lines += [f'shorts_span_peak_rss_bytes{{span="{name}"}} {int(t["peak_rss_mb"] * 1024 * 1024)}'
+                  for name, t in sorted(totals.items())]
+        rss = peak_rss_mb()
+        if rss is not None:
+            lines += ["# HELP shorts_process_peak_rss_bytes Peak RSS of this process.",
+                      "# TYPE shorts_process_peak_rss_bytes gauge",
+                      f"shorts_process_peak_rss_bytes {int(rss * 1024 * 1024)}"]
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer()
+
+
+def traced(name, output_arg=None, **attrs):
+    """
+    Decorator: records a span around each call (sync or async). With output_arg, the size
+    of the file named by that argument after the call is recorded as the span's bytes.
+    The function can add its own attributes with tracer.annotate().
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def record_output(span, args, kwargs):
+            if not output_arg:
+                return
+            path = signature.bind(*args, **kwargs).arguments.get(output_arg)
+            span['bytes'] = os.path.getsize(path) if path and os.path.exists(path) else 0
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name, **attrs) as span:
+                    result = await fn(*args, **kwargs)
+                    record_output(span, args, kwargs)
+                    return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name, **attrs) as span:
+                result = fn(*args, **kwargs)
+                record_output(span, args, kwargs)
+                return result
+        return wrapper
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = tracer.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # keep scrapes out of the app log
+
+
+def start_metrics_server(port=None, host=None):
+    """Serves /metrics on METRICS_PORT from a daemon thread. Returns the server, or None if no port is set."""
+    port = port or int(os.getenv("METRICS_PORT", "0"))
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host or os.getenv("METRICS_HOST", "127.0.0.1"), port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Serving metrics on http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    return server
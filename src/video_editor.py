@@ -1,27 +1,213 @@
 from moviepy.editor import *
 import os
+import json
+import time
 import PIL.Image
 import gc
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.ffmpeg_tools import can_stream_copy, concat_stream_copy, mix_background_music
+from src.ffmpeg_renderer import FFmpegRenderer
+from src.media_cache import MediaCache, file_digest, link_or_copy
+from src.workspace import get_workspace_manager
+from src.tracing import tracer, traced, peak_rss_mb
+
+# Bump when render_scene's output changes so stale cached scenes aren't reused
+SCENE_RENDER_VERSION = 1
+
+FULL_PROFILE = {'scale': 1.0, 'fps': 24, 'preset': 'ultrafast', 'crf': 23, 'stroke_width': 2}
+# Quick preview: a third of the resolution, half the frame rate, low bitrate, thin subtitle outline
+DRAFT_PROFILE = {'scale': 1 / 3, 'fps': 12, 'preset': 'ultrafast', 'crf': 32, 'stroke_width': 1}
 
 # Fix for Pillow 10.0.0+ removing ANTIALIAS
 if not hasattr(PIL.Image, 'ANTIALIAS'):
     PIL.Image.ANTIALIAS = PIL.Image.LANCZOS
 
-from moviepy.config import change_settings
-change_settings({"IMAGEMAGICK_BINARY": r"C:\Program Files\ImageMagick-7.1.2-Q16-HDRI\magick.exe"})
+from src.subtitle_renderer import SubtitleOverlay
+
+
+
+def voice_master_path(output_path):
+    """Where the music-free render of output_path is kept, so its music can be swapped later."""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}.voice{ext or '.mp4'}"
+
+
+def _available_memory_mb():
+    """Best-effort free RAM in MB (Linux /proc/meminfo, then sysconf)."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def cover_zoom(clip, target_width, target_height, zoom_rate=0.0):
+    """
+    Scales clip to cover target_width x target_height, center-crops it and, if zoom_rate
+    is set, slowly zooms in (Ken Burns: 1 + zoom_rate * t).
+    The crop window is computed in source pixels and resampled straight to the fixed
+    output size, so each frame costs one resize from the full-resolution source.
+    """
+    src_w, src_h = clip.size
+    if (src_w, src_h) == (target_width, target_height) and not zoom_rate:
+        return clip
+
+    scale = max(target_width / src_w, target_height / src_h)
+    base_w = target_width / scale
+    base_h = target_height / scale
+    center_x = src_w / 2
+    center_y = src_h / 2
+
+    def fit(get_frame, t):
+        zoom = 1 + zoom_rate * t
+        w = base_w / zoom
+        h = base_h / zoom
+        box = (center_x - w / 2, center_y - h / 2, center_x + w / 2, center_y + h / 2)
+        image = PIL.Image.fromarray(get_frame(t))
+        return np.asarray(image.resize((target_width, target_height), PIL.Image.BILINEAR, box=box))
+
+    fitted = clip.fl(fit)
+    fitted.size = (target_width, target_height)
+    # The background fills the whole frame, a source alpha mask (e.g. PNG) isn't needed
+    fitted.mask = None
+    return fitted
+
+
+def render_scene(idx, asset, settings, temp_scene_path):
+    """
+    Bakes a single scene (footage + voiceover + subtitles) to temp_scene_path.
+    Module-level so it can run in a worker process. Raises on failure.
+    """
+    video_path = asset['video']
+    audio_path = asset['audio']
+    subtitles = asset['subtitles']
+    target_width = settings['target_width']
+    target_height = settings['target_height']
+    
+    print(f"Processing Scene {idx+1}...")
+    
+    # Load Content
+    # Check for image extensions
+    if video_path.lower().endswith(('.jpg', '.jpeg', '.png')):
+         video_clip = ImageClip(video_path).set_duration(10) # Placeholder duration
+    else:
+        video_clip = VideoFileClip(video_path)
+    
+    audio_clip = AudioFileClip(audio_path)
+
+    # Match Duration
+    final_duration = audio_clip.duration
+    video_clip = video_clip.set_duration(final_duration)
+    
+    # Loop ONLY if it's a video
+    if not video_path.lower().endswith(('.jpg', '.jpeg', '.png')):
+        video_clip = video_clip.loop(duration=final_duration)
+
+    # --- ROBUST RESIZE TO COVER (+ KEN BURNS) ---
+    # Cover-resize, center crop and the optional zoom are folded into one resample per frame
+    zoom_rate = 0.02 if settings['use_ken_burns'] else 0.0
+    video_clip = cover_zoom(video_clip, target_width, target_height, zoom_rate)
+    
+    # Set Audio
+    video_clip = video_clip.set_audio(audio_clip)
+
+    # Burn Subtitles
+    # One overlay layer for the whole word timeline instead of a clip per word
+    overlay = SubtitleOverlay(subtitles, (target_width, target_height), settings['font'], settings['font_size'], settings['text_color'], 'black', settings['stroke_width'])
+    scene_final = overlay.apply_to(video_clip).set_duration(final_duration)
+    
+    # --- MEMORY OPTIMIZATION: Render Scene Immediately ---
+    # Instead of keeping the complex graph in memory, we bake it to a file.
+    print(f"Rendering intermediate scene to {temp_scene_path}...")
+    
+    try:
+        scene_final.write_videofile(
+            temp_scene_path, 
+            fps=settings['fps'], 
+            codec="libx264", 
+            audio_codec="aac", 
+            preset=settings['preset'], 
+            ffmpeg_params=["-crf", str(settings['crf'])],
+            threads=settings.get('threads', 1), 
+            logger=None # Silence logs for individual scenes
+        )
+    finally:
+        # Close complex objects to free RAM immediately
+        scene_final.close()
+        video_clip.close()
+        audio_clip.close()
+        gc.collect() # Force cleanup
+    
+    return temp_scene_path
 
 
+def render_scene_timed(idx, asset, settings, temp_scene_path):
+    """
+    Worker entry point: render_scene plus its cost (seconds, worker peak RSS), which the
+    parent records as a trace span since workers don't write traces themselves.
+    """
+    started = time.perf_counter()
+    render_scene(idx, asset, settings, temp_scene_path)
+    return temp_scene_path, {'seconds': time.perf_counter() - started, 'peak_rss_mb': peak_rss_mb()}
+
 
 class VideoEditor:
     def __init__(self, font_path="fonts/Montserrat-Black.ttf"):
         self.font = font_path if os.path.exists(font_path) else "Arial"
-        # Increase ImageMagick compatibility
-        # If user faces issues, they might need config_defaults.py edits, but we assume standard install.
+        self.failed_scenes = []
+        self.scene_cache = MediaCache(
+            root=os.getenv("SCENE_CACHE_DIR", os.path.join(".cache", "scenes")),
+            max_bytes=int(float(os.getenv("SCENE_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+        )
+
+    def _scene_key(self, asset, settings):
+        """
+        Fingerprint of everything that affects a baked scene: footage and voiceover
+        content, the word timeline and the render style. None if the media can't be read.
+        """
+        try:
+            video_digest = file_digest(asset['video'])
+            audio_digest = file_digest(asset['audio'])
+        except OSError:
+            return None
+        style = {k: v for k, v in settings.items() if k != 'threads'}
+        return self.scene_cache.make_key(
+            "scene", SCENE_RENDER_VERSION, video_digest, audio_digest,
+            json.dumps(asset['subtitles'], sort_keys=True),
+            json.dumps(style, sort_keys=True)
+        )
 
-    def create_shorts(self, scene_assets, output_path="output.mp4", music_path=None, watermark_path=None, use_ken_burns=False, aspect_ratio="9:16", text_color="white"):
-        print(f"Editing video ({aspect_ratio})...")
+    def _plan_workers(self, num_scenes, workers=None, worker_memory_mb=None):
+        """Picks the render pool size: capped by CPU count, scene count and the RAM budget per worker."""
+        cpu_count = os.cpu_count() or 1
+        workers = workers or int(os.getenv("RENDER_WORKERS", "0")) or cpu_count
+        worker_memory_mb = worker_memory_mb or int(os.getenv("RENDER_WORKER_MEMORY_MB", "1500"))
+
+        available_mb = _available_memory_mb()
+        if available_mb is not None:
+            workers = min(workers, max(1, available_mb // worker_memory_mb))
+        return max(1, min(workers, num_scenes))
+
+    @traced("create_shorts")
+    def create_shorts(self, scene_assets, output_path="output.mp4", music_path=None, watermark_path=None, use_ken_burns=False, aspect_ratio="9:16", text_color="white", workers=None, worker_memory_mb=None, backend=None, duck_music=False, draft=False, work_dir=None, on_progress=None):
+        """
+        Renders the job to output_path and returns it (None on failure).
+        on_progress(stage, idx, done, total) is called from this thread as scenes finish
+        (stage "scene") and when the "assemble" and "music" passes start.
+        """
+        report = on_progress or (lambda stage, idx, done, total: None)
+        tracer.annotate(scenes=len(scene_assets), draft=draft)
+        print(f"Editing video ({aspect_ratio}{', draft' if draft else ''})...")
         
-        final_clips = []
+        self.failed_scenes = []
         
         target_width = 1080
         target_height = 1920
@@ -29,149 +215,209 @@ class VideoEditor:
         if aspect_ratio == "16:9":
             target_width = 1920
             target_height = 1080
-        
-        for idx, asset in enumerate(scene_assets):
-            video_path = asset['video']
-            audio_path = asset['audio']
-            subtitles = asset['subtitles']
-            
-            print(f"Processing Scene {idx+1}...")
-            
-            try:
-                # Load Content
-                # Check for image extensions
-                if video_path.lower().endswith(('.jpg', '.jpeg', '.png')):
-                     video_clip = ImageClip(video_path).set_duration(10) # Placeholder duration
-                else:
-                    video_clip = VideoFileClip(video_path)
-                
-                audio_clip = AudioFileClip(audio_path)
-            except Exception as e:
-                print(f"Error loading media for scene {idx}: {e}")
-                continue
 
-            # Match Duration
-            final_duration = audio_clip.duration
-            video_clip = video_clip.set_duration(final_duration)
-            
-            # Loop ONLY if it's a video
-            if not video_path.lower().endswith(('.jpg', '.jpeg', '.png')):
-                video_clip = video_clip.loop(duration=final_duration)
-
-            # --- ROBUST RESIZE TO COVER ---
-            # Calculate scale factor to cover the target area entirely
-            scale_w = target_width / video_clip.w
-            scale_h = target_height / video_clip.h
-            scale_factor = max(scale_w, scale_h)
-            
-            # Resize
-            # Note: We resize by ratio to preserve aspect ratio
-            video_clip = video_clip.resize(scale_factor)
-            
-            # Center Crop
-            # Now the clip is guaranteed to be >= target dimensions
-            x_center = video_clip.w / 2
-            y_center = video_clip.h / 2
-            video_clip = video_clip.crop(
-                x1=x_center - target_width / 2,
-                y1=y_center - target_height / 2,
-                width=target_width,
-                height=target_height
-            )
-            
-            # --- KEN BURNS EFFECT (Optional) ---
-            if use_ken_burns:
-                print(f"Applying Ken Burns to Scene {idx+1}")
-                video_clip = video_clip.resize(lambda t: 1 + 0.02 * t) 
-            
-            # Set Audio
-            video_clip = video_clip.set_audio(audio_clip)
-
-            # Generate Subtitle Clips
-            text_clips = []
-            for item in subtitles:
-                word = item['word']
-                start = item['start']
-                end = item['end']
-                duration = end - start
-                
-                if duration <= 0: continue
-                
-                try:
-                    txt_clip = (TextClip(word, fontsize=80, color=text_color, font=self.font, stroke_color='black', stroke_width=2)
-                                .set_position('center')
-                                .set_start(start)
-                                .set_duration(duration))
-                    text_clips.append(txt_clip)
-                except Exception as e:
-                    print(f"Error creating text clip: {e}")
+        # --- QUALITY PROFILE ---
+        # Draft: fraction of the resolution and frame rate, smaller thinner subtitles
+        profile = DRAFT_PROFILE if draft else FULL_PROFILE
+        target_width = int(target_width * profile['scale']) // 2 * 2
+        target_height = int(target_height * profile['scale']) // 2 * 2
+        style = {
+            'target_width': target_width,
+            'target_height': target_height,
+            'use_ken_burns': use_ken_burns,
+            'text_color': text_color,
+            'font': self.font,
+            'fps': profile['fps'],
+            'preset': profile['preset'],
+            'font_size': max(int(80 * profile['scale']), 12),
+            'stroke_width': profile['stroke_width'],
+            'crf': profile['crf'],
+            'watermark_height': max(int(100 * profile['scale']), 16)
+        }
 
-            # Composite Scene
-            scene_final = CompositeVideoClip([video_clip] + text_clips).set_duration(final_duration)
-            
-            # --- MEMORY OPTIMIZATION: Render Scene Immediately ---
-            # Instead of keeping the complex graph in memory, we bake it to a file.
-            temp_scene_path = f"temp_scene_{idx}.mp4"
-            print(f"Rendering intermediate scene to {temp_scene_path}...")
-            
-            try:
-                scene_final.write_videofile(
-                    temp_scene_path, 
-                    fps=24, 
-                    codec="libx264", 
-                    audio_codec="aac", 
-                    preset='ultrafast', 
-                    threads=1, 
-                    logger=None # Silence logs for individual scenes
+        has_music = bool(music_path and os.path.exists(music_path))
+        has_watermark = bool(watermark_path and os.path.exists(watermark_path))
+        # Music is mixed in an audio-only pass at the end, so the picture is rendered without it.
+        # That voice-only master is kept next to the output for add_music to swap the bed later.
+        video_output = voice_master_path(output_path) if has_music else output_path
+        if not has_music:
+            # A master left by an earlier render to this path no longer matches the picture
+            self._remove_files([voice_master_path(output_path)])
+
+        video_path = None
+        # --- NATIVE FFMPEG BACKEND (Optional) ---
+        # Whole job as one filtergraph; MoviePy below stays the fallback
+        backend = backend or os.getenv("RENDER_BACKEND", "moviepy")
+        tracer.annotate(backend=backend)
+        if backend == "ffmpeg":
+            report("assemble", None, 0, 1)
+            renderer = FFmpegRenderer(self.font)
+            with tracer.span("assemble", backend="ffmpeg", scenes=len(scene_assets)) as assemble_span:
+                video_path = renderer.render(
+                    scene_assets, video_output,
+                    watermark_path=watermark_path,
+                    use_ken_burns=use_ken_burns,
+                    size=(target_width, target_height),
+                    text_color=text_color,
+                    fps=style['fps'],
+                    font_size=style['font_size'],
+                    stroke_width=style['stroke_width'],
+                    preset=style['preset'],
+                    crf=style['crf'],
+                    watermark_height=style['watermark_height']
                 )
-            except Exception as e:
-                print(f"Error rendering temp scene {idx}: {e}")
-                continue
-            
-            # Close complex objects to free RAM immediately
-            scene_final.close()
-            video_clip.close()
-            audio_clip.close()
-            for tc in text_clips: tc.close()
-            gc.collect() # Force cleanup
+                assemble_span['bytes'] = os.path.getsize(video_path) if video_path else 0
+            if video_path:
+                self.failed_scenes = list(renderer.failed_scenes)
+            else:
+                print("Falling back to MoviePy renderer...")
+
+        if not video_path:
+            render_args = (scene_assets, video_output, watermark_path if has_watermark else None,
+                           style, workers, worker_memory_mb)
+            if work_dir:
+                os.makedirs(work_dir, exist_ok=True)
+                video_path = self._render_moviepy(*render_args, work_dir, report)
+            else:
+                # Temp scenes go to a throwaway workspace rather than the current directory
+                with get_workspace_manager().job("render") as workspace:
+                    video_path = self._render_moviepy(*render_args, workspace.path, report)
+        if not video_path:
+            tracer.annotate(failed=True)
+            return None
+
+        # --- BACKGROUND MUSIC (Audio-only pass) ---
+        if has_music:
+            report("music", None, 0, 1)
+            with tracer.span("mix_music", duck=duck_music):
+                output_path = self.add_music(video_path, music_path, output_path, duck=duck_music)
+
+        tracer.annotate(bytes=os.path.getsize(output_path), failed_scenes=len(self.failed_scenes))
+        return output_path
+
+    def add_music(self, video_path, music_path, output_path=None, volume=0.12, duck=False):
+        """
+        Mixes a (looped) music bed under a finished video's audio and remuxes it with the
+        video stream copied untouched, so adding or swapping music never re-encodes the picture.
+        The bed is always mixed onto the voice-only master (voice_master_path), which is kept
+        next to the result: calling this again on a short swaps its music instead of stacking
+        a second bed on top. Writes in place when output_path is None.
+        """
+        print(f"Adding background music: {music_path}")
+        target = output_path or video_path
+        source = voice_master_path(video_path)
+        if not os.path.exists(source):
+            source = video_path # not mixed yet, so video_path itself is voice-only
+        master = voice_master_path(target)
+        tmp_path = f"{target}.music.mp4"
+        try:
+            mix_background_music(source, music_path, tmp_path, volume=volume, duck=duck)
+            if source != master:
+                link_or_copy(source, master)
+            os.replace(tmp_path, target)
+            return target
+        except (RuntimeError, OSError) as e:
+            print(f"Error adding background music: {e}")
+            self._remove_files([tmp_path])
+            if target != source:
+                # Keep the render; ship it without music
+                link_or_copy(source, target)
+            return target
+
+    def _render_moviepy(self, scene_assets, output_path, watermark_path, style, workers, worker_memory_mb, work_dir, report):
+        num_workers = self._plan_workers(len(scene_assets), workers, worker_memory_mb)
+        settings = dict(style)
+        # Split the cores between the workers' ffmpeg encoders
+        settings['threads'] = max(1, (os.cpu_count() or 1) // num_workers)
+        
+        # --- PARALLEL SCENE RENDERING ---
+        # Each scene is baked in its own process; "spawn" keeps workers clear of the
+        # parent's threads (Streamlit, download pools).
+        print(f"Rendering {len(scene_assets)} scenes on {num_workers} workers...")
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            total = len(scene_assets)
+            futures = {}
+            scene_keys = []
+            rendered = {}
+            for idx, asset in enumerate(scene_assets):
+                temp_scene_path = os.path.join(work_dir, f"temp_scene_{idx}.mp4")
+                scene_key = self._scene_key(asset, settings)
+                scene_keys.append(scene_key)
+                # Unchanged scenes (same media, words and style) are reused from the render cache
+                if scene_key and self.scene_cache.fetch(scene_key, temp_scene_path):
+                    print(f"Scene {idx+1} unchanged, reusing cached render")
+                    rendered[idx] = temp_scene_path
+                    report("scene", idx, len(rendered), total)
+                    continue
+                futures[pool.submit(render_scene_timed, idx, asset, settings, temp_scene_path)] = idx
             
-            # Load the baked clip (low memory footprint)
-            baked_clip = VideoFileClip(temp_scene_path)
-            final_clips.append(baked_clip)
+            # Collect as scenes finish (for progress); a failed scene is reported and skipped
+            done = len(rendered)
+            for future in as_completed(futures):
+                idx = futures[future]
+                done += 1
+                try:
+                    temp_scene_path, cost = future.result()
+                except Exception as e:
+                    print(f"Error rendering scene {idx}: {e}")
+                    self.failed_scenes.append((idx, str(e)))
+                    report("scene", idx, done, total)
+                    continue
+                if scene_keys[idx]:
+                    try:
+                        self.scene_cache.store(scene_keys[idx], temp_scene_path)
+                        self.scene_cache.fetch(scene_keys[idx], temp_scene_path)
+                    except OSError as e:
+                        print(f"Scene cache write failed: {e}")
+                tracer.record("render_scene", cost['seconds'], bytes=os.path.getsize(temp_scene_path),
+                              peak_rss_mb=cost['peak_rss_mb'], scene=idx, workers=num_workers)
+                rendered[idx] = temp_scene_path
+                report("scene", idx, done, total)
+            self.failed_scenes.sort()
+            scene_paths = [rendered[idx] for idx in sorted(rendered)]
         
-        if not final_clips:
+        if not scene_paths:
             print("No valid scenes to compile.")
             return None
 
-        # Concatenate All Scenes (Now just simple video files)
+        report("assemble", None, 0, 1)
+        with tracer.span("assemble", backend="moviepy", scenes=len(scene_paths), watermark=bool(watermark_path)) as span:
+            result = self._assemble(scene_paths, output_path, watermark_path, style)
+            span['bytes'] = os.path.getsize(result) if result else 0
+            span['peak_rss_children_mb'] = peak_rss_mb("children")
+        return result
+
+    def _assemble(self, scene_paths, output_path, watermark_path, style):
+        # --- FINAL ASSEMBLY ---
+        # Baked scenes share codec/size/fps, so they can be joined by the concat demuxer
+        # without decoding. Only the watermark still needs a pass through MoviePy.
+        joined_path = output_path if not watermark_path else f"{output_path}.joined.mp4"
         print("Concatenating scenes...")
+        copyable = can_stream_copy(scene_paths)
+        if copyable and concat_stream_copy(scene_paths, joined_path):
+            if joined_path == output_path:
+                self._remove_files(scene_paths)
+                return output_path
+            final_clips = [VideoFileClip(joined_path)]
+        else:
+            if copyable:
+                # concat_stream_copy has already printed the ffmpeg error
+                print("Re-encoding instead of stream copy...")
+                self._remove_files([joined_path])
+            else:
+                print("Scene parameters differ, re-encoding instead of stream copy...")
+            joined_path = None
+            # Load the baked clips (low memory footprint)
+            final_clips = [VideoFileClip(p) for p in scene_paths]
         final_video = concatenate_videoclips(final_clips)
         
-        # Add Background Music (Global)
-        if music_path and os.path.exists(music_path):
-            print(f"Adding background music: {music_path}")
-            try:
-                bg_music = AudioFileClip(music_path)
-                
-                if bg_music.duration < final_video.duration:
-                    bg_music = afx.audio_loop(bg_music, duration=final_video.duration)
-                else:
-                    bg_music = bg_music.subclip(0, final_video.duration)
-                
-                bg_music = bg_music.volumex(0.12)
-                
-                final_audio = CompositeAudioClip([final_video.audio, bg_music])
-                final_video = final_video.set_audio(final_audio)
-            except Exception as e:
-                print(f"Error adding background music: {e}")
-        
         # Add Watermark (Global)
-        if watermark_path and os.path.exists(watermark_path):
+        if watermark_path:
             print(f"Adding watermark: {watermark_path}")
             try:
                 watermark = (ImageClip(watermark_path)
                              .set_duration(final_video.duration)
-                             .resize(height=100) 
+                             .resize(height=style['watermark_height']) 
                              .margin(right=20, top=20, opacity=0)
                              .set_pos(("right", "top")))
                 
@@ -186,11 +432,12 @@ class VideoEditor:
         try:
             final_video.write_videofile(
                 output_path, 
-                fps=24,
+                fps=style['fps'],
                 codec="libx264", 
                 audio_codec="aac", 
-                preset='ultrafast', 
-                threads=1,
+                preset=style['preset'], 
+                ffmpeg_params=["-crf", str(style['crf'])],
+                threads=os.cpu_count() or 1,
                 logger='bar'
             )
         except Exception as e:
@@ -203,15 +450,19 @@ class VideoEditor:
             # Close baked clips and remove temp files
             for c in final_clips:
                 c.close()
-                if os.path.exists(c.filename):
-                    os.remove(c.filename)
-            
-            if music_path: bg_music.close()
         except Exception as e:
             print(f"Cleanup warning: {e}")
-            pass
+        self._remove_files(scene_paths + ([joined_path] if joined_path else []))
             
         return output_path
 
+    def _remove_files(self, paths):
+        for path in paths:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                print(f"Cleanup warning: {e}")
+
 if __name__ == "__main__":
     pass
@@ -0,0 +1,151 @@
+import os
+import time
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+
+HEARTBEAT = ".heartbeat"
+
+
+class WorkspaceQuotaError(RuntimeError):
+    pass
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass # removed while walking
+    return total
+
+
+class Workspace:
+    """One job's private scratch directory. Everything a job writes before its final output lives here."""
+
+    def __init__(self, manager, workspace_id):
+        self.manager = manager
+        self.id = workspace_id
+        self.path = os.path.join(manager.root, workspace_id)
+
+    def file(self, *parts):
+        """Path inside the workspace; parent directories are created."""
+        path = os.path.join(self.path, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def dir(self, *parts):
+        path = os.path.join(self.path, *parts)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def touch(self):
+        """Marks the workspace as in use so the stale sweep leaves it alone."""
+        try:
+            os.utime(os.path.join(self.path, HEARTBEAT))
+        except OSError:
+            pass
+
+    def exists(self):
+        return os.path.isdir(self.path)
+
+    def usage(self):
+        return _dir_size(self.path)
+
+    def check_quota(self):
+        """Raises WorkspaceQuotaError if the scratch root is over its quota."""
+        self.touch()
+        self.manager.check_quota()
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class WorkspaceManager:
+    """
+    Hands out per-job workspaces under a scratch root (SCRATCH_ROOT, e.g. a tmpfs or local
+    NVMe mount) so concurrent jobs never share intermediate file names.
+    The root is kept under a disk quota; workspaces are removed when their job ends, and
+    any whose heartbeat is older than the stale timeout (crashed or abandoned sessions)
+    are swept before new ones are created. Finished videos go to OUTPUT_DIR instead.
+    """
+
+    def __init__(self, root=None, quota_bytes=None, stale_seconds=None, output_dir=None):
+        self.root = root or os.getenv("SCRATCH_ROOT", os.path.join(".cache", "work"))
+        self.quota_bytes = quota_bytes or int(float(os.getenv("SCRATCH_QUOTA_MB", "20480")) * 1024 * 1024)
+        self.stale_seconds = stale_seconds or float(os.getenv("WORKSPACE_STALE_HOURS", "6")) * 3600
+        self.output_dir = output_dir or os.getenv("OUTPUT_DIR", "outputs")
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def create(self, name=None):
+        """Creates a new workspace. Raises WorkspaceQuotaError if the scratch root is full."""
+        workspace_id = f"{name}-{uuid.uuid4().hex[:8]}" if name else uuid.uuid4().hex[:12]
+        with self._lock:
+            self.sweep()
+            self.check_quota()
+            workspace = Workspace(self, workspace_id)
+            os.makedirs(workspace.path)
+            open(os.path.join(workspace.path, HEARTBEAT), "w").close()
+        return workspace
+
+    def get(self, workspace_id):
+        """Reattaches to an existing workspace (e.g. after a page refresh), or None if it's gone."""
+        workspace = Workspace(self, os.path.basename(workspace_id))
+        if not workspace.exists():
+            return None
+        workspace.touch()
+        return workspace
+
+    def output_path(self, name, ext=".mp4"):
+        return os.path.join(self.output_dir, f"{name}{ext}")
+
+    def usage(self):
+        return _dir_size(self.root)
+
+    def check_quota(self):
+        used = self.usage()
+        if used > self.quota_bytes:
+            raise WorkspaceQuotaError(
+                f"Scratch space {self.root} is over quota ({used // (1024 * 1024)} MB of "
+                f"{self.quota_bytes // (1024 * 1024)} MB)"
+            )
+
+    def sweep(self):
+        """Removes workspaces whose heartbeat is older than the stale timeout."""
+        cutoff = time.time() - self.stale_seconds
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            try:
+                last_seen = os.path.getmtime(os.path.join(entry.path, HEARTBEAT))
+            except OSError:
+                last_seen = entry.stat().st_mtime
+            if last_seen < cutoff:
+                print(f"Removing stale workspace {entry.name}")
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    @contextmanager
+    def job(self, name=None):
+        """Workspace for the duration of a block; removed on success or failure."""
+        workspace = self.create(name)
+        try:
+            yield workspace
+        finally:
+            workspace.cleanup()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_workspace_manager():
+    """The process-wide workspace manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = WorkspaceManager()
+        return _manager
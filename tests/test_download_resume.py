@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Ensure we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("requests")
+media_fetcher = pytest.importorskip("src.media_fetcher")
+
+BLOB = bytes(range(256)) * 4096 # 1 MiB
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Serves BLOB with Range support; each request pops its behaviour off server.script."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        action = self.server.script.pop(0) if self.server.script else "ok"
+        self.server.ranges.append(self.headers.get("Range"))
+        if action.isdigit():
+            self.send_response(int(action))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(BLOB) - 1}/{len(BLOB)}")
+        else:
+            self.send_response(200)
+        body = BLOB[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        # "truncate" drops the connection halfway through the body
+        self.wfile.write(body[:len(body) // 2] if action == "truncate" else body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    httpd.script, httpd.ranges = [], []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def fetcher(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEDIA_CACHE_DIR", str(tmp_path / "media"))
+    monkeypatch.setenv("TTS_CACHE_DIR", str(tmp_path / "tts"))
+    monkeypatch.setattr(media_fetcher.tracer, "path", "")
+    monkeypatch.setattr(media_fetcher.time, "sleep", lambda seconds: None)
+    # Small chunks so the bytes before a dropped connection reach the partial file
+    monkeypatch.setattr(media_fetcher, "DOWNLOAD_CHUNK_SIZE", 64 * 1024)
+    return media_fetcher.MediaFetcher()
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/clip.mp4"
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_truncated_transfer_resumes_with_a_range_request(server, fetcher, tmp_path):
+    server.script = ["truncate"]
+    dest = str(tmp_path / "video.mp4")
+
+    assert fetcher.download_url(url(server), dest, media_id=1)
+
+    assert read(dest) == BLOB
+    assert server.ranges == [None, f"bytes={len(BLOB) // 2}-"]
+    assert fetcher.download_stats[-1]['resumed_from'] == len(BLOB) // 2
+
+
+def test_server_errors_are_retried_and_keep_the_partial_file(server, fetcher, tmp_path):
+    server.script = ["truncate", "503", "ok"]
+    dest = str(tmp_path / "video.mp4")
+
+    assert fetcher.download_url(url(server), dest, media_id=2)
+
+    assert read(dest) == BLOB
+    # The retry after the 503 still resumes from the bytes already on disk
+    assert server.ranges[1:] == [f"bytes={len(BLOB) // 2}-"] * 2
+
+
+def test_exhausted_server_errors_keep_the_partial_for_the_next_attempt(server, fetcher, tmp_path):
+    server.script = ["truncate"] + ["429"] * (media_fetcher.DOWNLOAD_RETRIES - 1)
+    dest = str(tmp_path / "video.mp4")
+
+    assert not fetcher.download_url(url(server), dest, media_id=3)
+    assert fetcher.download_url(url(server), dest, media_id=3)
+
+    assert read(dest) == BLOB
+    assert server.ranges[-1] == f"bytes={len(BLOB) // 2}-"
+
+
+def test_client_errors_discard_the_partial_file(server, fetcher, tmp_path):
+    server.script = ["truncate", "404"]
+    dest = str(tmp_path / "video.mp4")
+
+    assert not fetcher.download_url(url(server), dest, media_id=4)
+    assert fetcher.download_url(url(server), dest, media_id=4)
+
+    assert read(dest) == BLOB
+    assert server.ranges[-1] is None
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+# Ensure we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+ffmpeg_tools = pytest.importorskip("src.ffmpeg_tools")
+
+JPEG_BANNER = """Input #0, image2, from 'video_3.mp4':
+  Duration: 00:00:00.04, start: 0.000000, bitrate: 20139 kb/s
+  Stream #0:0: Video: mjpeg (Baseline), yuvj444p(pc, bt470bg/unknown/unknown), 800x600 [SAR 1:1 DAR 4:3], 25 tbr, 25 tbn, 25 tbc
+"""
+
+MP4_BANNER = """Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'scene_0.mp4':
+  Duration: 00:00:05.00, start: 0.000000, bitrate: 2650 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(tv, bt709, progressive), 1080x1920 [SAR 1:1 DAR 9:16], 2515 kb/s, 24 fps, 24 tbr, 12288 tbn (default)
+  Stream #0:1[0x2](und): Audio: aac (LC) (mp4a / 0x6134706D), 44100 Hz, stereo, fltp, 128 kb/s (default)
+"""
+
+
+def test_parses_pixel_formats_with_commas():
+    params = ffmpeg_tools.parse_stream_info(JPEG_BANNER)
+    assert params['video_codec'] == "mjpeg"
+    assert params['pix_fmt'] == "yuvj444p"
+    assert params['size'] == (800, 600)
+
+
+def test_parses_video_and_audio_streams():
+    assert ffmpeg_tools.parse_stream_info(MP4_BANNER) == {
+        'video_codec': "h264",
+        'pix_fmt': "yuv420p",
+        'size': (1080, 1920),
+        'fps': 24.0,
+        'audio_codec': "aac",
+        'sample_rate': 44100,
+        'channels': "stereo",
+    }
+
+
+def test_jpeg_saved_under_mp4_name_is_a_still(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    path = str(tmp_path / "video_0.mp4")
+    Image.new("RGB", (800, 600), (200, 40, 40)).save(path, format="JPEG")
+    assert ffmpeg_tools.is_still_image(path)
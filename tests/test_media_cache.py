@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+
+import pytest
+
+# Ensure we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.media_cache import MediaCache
+
+
+def write(path, data=b"data"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_stale_tmp_files_are_swept_on_init(tmp_path):
+    tmp_dir = tmp_path / "tmp"
+    stale = [write(str(tmp_dir / name)) for name in ("a.partial", "a.partial.lock", "b.1.2.part")]
+    fresh = write(str(tmp_dir / "c.partial"))
+    for path in stale:
+        age(path, 2 * 24 * 3600)
+
+    MediaCache(root=str(tmp_path))
+
+    assert not any(os.path.exists(p) for p in stale)
+    assert os.path.exists(fresh)
+
+
+def test_held_partial_lock_is_not_swept(tmp_path):
+    pytest.importorskip("fcntl")
+    cache = MediaCache(root=str(tmp_path))
+    with cache.partial("key") as part_path:
+        lock_path = f"{part_path}.lock"
+        age(lock_path, 2 * 24 * 3600)
+        cache._sweep_tmp()
+        assert os.path.exists(lock_path)
+
+
+def test_partial_relocks_after_its_lock_file_is_swept(tmp_path):
+    pytest.importorskip("fcntl")
+    cache = MediaCache(root=str(tmp_path))
+    with cache.partial("key") as part_path:
+        lock_path = f"{part_path}.lock"
+    age(lock_path, 2 * 24 * 3600)
+    cache._sweep_tmp()
+    assert not os.path.exists(lock_path)
+
+    with cache.partial("key"):
+        assert os.path.exists(lock_path)
+
+
+def store(cache, key, data):
+    return cache.store(key, write(cache.tmp_path(key), data))
+
+
+def test_store_and_fetch_round_trip(tmp_path):
+    cache = MediaCache(root=str(tmp_path / "cache"))
+    blob = store(cache, "clip", b"frames")
+    dest = str(tmp_path / "out.mp4")
+
+    assert cache.lookup("clip") == blob
+    assert cache.fetch("clip", dest)
+    with open(dest, 'rb') as f:
+        assert f.read() == b"frames"
+
+
+def test_verify_from_env_catches_same_size_corruption(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEDIA_CACHE_VERIFY", "1")
+    cache = MediaCache(root=str(tmp_path))
+    assert cache.verify
+    blob = store(cache, "clip", b"frames")
+    write(blob, b"FRAMES")
+
+    assert cache.lookup("clip") is None
+    assert not os.path.exists(blob)
+
+
+def test_size_check_only_by_default(tmp_path, monkeypatch):
+    monkeypatch.delenv("MEDIA_CACHE_VERIFY", raising=False)
+    cache = MediaCache(root=str(tmp_path))
+    blob = store(cache, "clip", b"frames")
+    write(blob, b"FRAMES")
+
+    assert cache.lookup("clip") == blob
+
+
+@pytest.mark.parametrize("ref", ['{"size": 6}', '{"sha256": "ab"}', '[1, 2]', 'null', '{"sha256": 1, "size": 6}', '{trunc'])
+def test_malformed_ref_is_a_miss_and_dropped(tmp_path, ref):
+    cache = MediaCache(root=str(tmp_path))
+    ref_path = write(cache._ref_path("clip"), ref.encode())
+
+    assert cache.lookup("clip") is None
+    assert not os.path.exists(ref_path)
+
+
+def test_least_recently_used_blobs_are_evicted_past_the_cap(tmp_path):
+    cache = MediaCache(root=str(tmp_path), max_bytes=10)
+    old = store(cache, "old", b"aaaa")
+    used = store(cache, "used", b"bbbb")
+    age(old, 60)
+    age(used, 120)
+    cache.lookup("used") # Refreshes its LRU clock
+
+    new = store(cache, "new", b"cccc")
+
+    assert not os.path.exists(old)
+    assert os.path.exists(used) and os.path.exists(new)
+    assert cache._size == 8
+
+
+def test_objects_are_only_walked_once_while_under_the_cap(tmp_path, monkeypatch):
+    cache = MediaCache(root=str(tmp_path), max_bytes=100)
+    scans = []
+    scan = cache._scan
+    monkeypatch.setattr(cache, "_scan", lambda: scans.append(1) or scan())
+
+    for i in range(5):
+        store(cache, f"clip{i}", bytes([i]) * 10)
+
+    assert len(scans) == 1
+    assert cache._size == 50
@@ -0,0 +1,91 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# Ensure we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+subtitle_gen = pytest.importorskip("src.subtitle_gen")
+
+
+class FlakyModel:
+    """Stands in for WhisperModel: the first `failures` loads raise, like a failed model download."""
+    failures = 0
+
+    def __init__(self, *args, **kwargs):
+        if FlakyModel.failures:
+            FlakyModel.failures -= 1
+            raise RuntimeError("model download failed")
+
+
+@pytest.fixture
+def flaky_whisper(monkeypatch):
+    monkeypatch.setattr(subtitle_gen, "WhisperModel", FlakyModel)
+    FlakyModel.failures = 1
+    return FlakyModel
+
+
+def acquire_in_thread(pool, timeout=5):
+    """Acquires a model on another thread; fails the test instead of hanging."""
+    result = {}
+
+    def borrow():
+        try:
+            with pool.acquire() as model:
+                result['model'] = model
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=borrow, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "acquire() blocked after a failed model load"
+    return result
+
+
+def test_failed_warm_up_releases_its_slot(flaky_whisper):
+    pool = subtitle_gen.ModelPool(size=1)
+    with pytest.raises(RuntimeError):
+        pool.warm_up()
+
+    result = acquire_in_thread(pool)
+    assert isinstance(result.get('model'), FlakyModel)
+    assert pool._created == 1
+
+
+def test_failed_acquire_releases_its_slot(flaky_whisper):
+    pool = subtitle_gen.ModelPool(size=1)
+    assert isinstance(acquire_in_thread(pool).get('error'), RuntimeError)
+
+    result = acquire_in_thread(pool)
+    assert isinstance(result.get('model'), FlakyModel)
+    assert pool._created == 1
+
+
+def test_waiter_retries_when_the_load_it_waits_on_fails(flaky_whisper):
+    pool = subtitle_gen.ModelPool(size=1)
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_create():
+        loading.set()
+        release.wait(5)
+        return FlakyModel()
+
+    pool._create = slow_create
+    warm_up = threading.Thread(target=lambda: pytest.raises(RuntimeError, pool.warm_up), daemon=True)
+    warm_up.start()
+    loading.wait(5)
+
+    # The pool is full while the warm-up load runs, so this caller waits on the idle queue
+    waiter = {}
+    thread = threading.Thread(target=lambda: waiter.update(acquire_in_thread(pool)), daemon=True)
+    thread.start()
+    release.set()
+    warm_up.join(5)
+    thread.join(10)
+
+    assert isinstance(waiter.get('model'), FlakyModel)
+    assert pool._created == 1
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+# Ensure we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+render_scheduler = pytest.importorskip("src.render_scheduler")
+from src.workspace import WorkspaceManager
+
+
+class FakeEditor:
+    """Stands in for VideoEditor: records the render order and holds each render until released."""
+    started = []
+    gate = threading.Event()
+
+    def __init__(self, font_path):
+        self.failed_scenes = []
+
+    def create_shorts(self, scene_assets, output_path, on_progress=None, work_dir=None, **kwargs):
+        FakeEditor.started.append(kwargs.get('tag'))
+        FakeEditor.gate.wait(5)
+        with open(output_path, "w") as f:
+            f.write("video")
+        return output_path
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    manager = WorkspaceManager(root=str(tmp_path / "work"), output_dir=str(tmp_path / "outputs"))
+    monkeypatch.setattr(render_scheduler, "get_workspace_manager", lambda: manager)
+    monkeypatch.setattr(render_scheduler, "VideoEditor", FakeEditor)
+    FakeEditor.started = []
+    FakeEditor.gate = threading.Event()
+    yield manager
+    FakeEditor.gate.set()
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def submit(scheduler, tag, **kwargs):
+    return scheduler.submit([{}], tag=tag, **kwargs)
+
+
+def test_previews_jump_queued_finals_and_equal_priorities_stay_fifo(manager):
+    scheduler = render_scheduler.RenderScheduler(max_concurrent=1)
+    running = submit(scheduler, "running")
+    wait_for(lambda: FakeEditor.started == ["running"])
+
+    final_a = submit(scheduler, "final_a")
+    final_b = submit(scheduler, "final_b")
+    preview = submit(scheduler, "preview", priority=render_scheduler.PREVIEW_PRIORITY)
+
+    assert [scheduler.get(j)['position'] for j in (preview, final_a, final_b)] == [1, 2, 3]
+    assert scheduler.get(running)['position'] is None
+
+    FakeEditor.gate.set()
+    wait_for(lambda: scheduler.get(final_b)['status'] == "done")
+    assert FakeEditor.started == ["running", "preview", "final_a", "final_b"]
+
+
+def test_cancel_removes_a_queued_job_and_its_workspace(manager):
+    scheduler = render_scheduler.RenderScheduler(max_concurrent=1)
+    running = submit(scheduler, "running")
+    wait_for(lambda: FakeEditor.started == ["running"])
+    workspace = manager.create("session")
+    queued = submit(scheduler, "queued", workspace=workspace)
+
+    assert scheduler.cancel(queued)
+    assert scheduler.get(queued)['status'] == "cancelled"
+    assert not workspace.exists()
+    # Only queued jobs can be cancelled
+    assert not scheduler.cancel(running)
+    assert not scheduler.cancel(queued)
+
+    FakeEditor.gate.set()
+    wait_for(lambda: scheduler.get(running)['status'] == "done")
+    assert FakeEditor.started == ["running"]
+
+
+def test_expired_jobs_are_pruned_with_the_outputs_they_own(manager, tmp_path):
+    FakeEditor.gate.set()
+    scheduler = render_scheduler.RenderScheduler(max_concurrent=1, keep_seconds=60)
+    owned = submit(scheduler, "owned")
+    kept_path = str(tmp_path / "draft_preview.mp4")
+    kept = submit(scheduler, "kept", output_path=kept_path)
+    wait_for(lambda: scheduler.get(kept)['status'] == "done")
+
+    owned_path = scheduler.get(owned)['result']
+    master = render_scheduler.voice_master_path(owned_path)
+    with open(master, "w") as f:
+        f.write("voice")
+    for job_id in (owned, kept):
+        scheduler._jobs[job_id].finished -= 120
+
+    assert scheduler.get(owned) is None and scheduler.get(kept) is None
+    assert not os.path.exists(owned_path) and not os.path.exists(master)
+    # The caller chose this path, so the caller cleans it up
+    assert os.path.exists(kept_path)
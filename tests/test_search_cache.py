@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+import time
+
+# Ensure we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.media_cache import SearchCache
+
+
+def test_hits_within_ttl_skip_the_fetch():
+    cache = SearchCache(ttl=60)
+    calls = []
+
+    assert cache.get_or_fetch("ocean", lambda: calls.append(1) or ["clip"]) == ["clip"]
+    assert cache.get_or_fetch("ocean", lambda: calls.append(1) or ["other"]) == ["clip"]
+    assert len(calls) == 1
+
+
+def test_expired_entries_are_fetched_again():
+    cache = SearchCache(ttl=0)
+    cache.get_or_fetch("ocean", lambda: 1)
+    time.sleep(0.01)
+
+    assert cache.get_or_fetch("ocean", lambda: 2) == 2
+
+
+def test_least_recently_used_entry_is_dropped_past_max_entries():
+    cache = SearchCache(ttl=60, max_entries=2)
+    cache.get_or_fetch("a", lambda: "a")
+    cache.get_or_fetch("b", lambda: "b")
+    cache.get_or_fetch("a", lambda: "stale") # Hit: "b" is now the oldest
+    cache.get_or_fetch("c", lambda: "c")
+
+    assert list(cache._entries) == ["a", "c"]
+
+
+def test_concurrent_lookups_share_one_fetch():
+    cache = SearchCache(ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return ["clip"]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch("ocean", slow_fetch)))
+               for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [["clip"]] * 4
+    assert len(calls) == 1
+
+
+def test_entries_persist_to_disk(tmp_path):
+    SearchCache(ttl=60, disk_dir=str(tmp_path)).get_or_fetch(("ocean", 5), lambda: ["clip"])
+
+    assert SearchCache(ttl=60, disk_dir=str(tmp_path)).get_or_fetch(("ocean", 5), lambda: ["other"]) == ["clip"]
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+# Ensure we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+media_fetcher = pytest.importorskip("src.media_fetcher")
+select_rendition = media_fetcher.select_rendition
+
+
+def rendition(width, height, quality="hd"):
+    return {'width': width, 'height': height, 'quality': quality,
+            'link': f"https://videos.example/{width}x{height}.mp4"}
+
+
+def test_smallest_rendition_covering_the_frame_wins():
+    files = [rendition(2160, 3840, "uhd"), rendition(1080, 1920), rendition(720, 1280, "sd")]
+
+    assert select_rendition(files, (1080, 1920)) == files[1]
+
+
+def test_both_sides_must_cover_the_frame():
+    # Wide enough but too short for a portrait canvas
+    files = [rendition(1920, 1080), rendition(1440, 2560)]
+
+    assert select_rendition(files, (1080, 1920)) == files[1]
+
+
+def test_largest_rendition_when_none_covers_the_frame():
+    files = [rendition(640, 360, "sd"), rendition(1280, 720), rendition(960, 540, "sd")]
+
+    assert select_rendition(files, (1080, 1920)) == files[1]
+
+
+def test_renditions_without_size_or_link_are_ignored():
+    files = [{'width': None, 'height': None, 'link': "https://videos.example/hls.m3u8"},
+             dict(rendition(4096, 2160), link=None),
+             rendition(1920, 1080)]
+
+    assert select_rendition(files, (1920, 1080)) == files[2]
+    assert select_rendition(files[:2], (1920, 1080)) is None
@@ -0,0 +1,106 @@
+import os
+import sys
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+# Ensure we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+subtitle_gen = pytest.importorskip("src.subtitle_gen")
+np = pytest.importorskip("numpy")
+
+SR = subtitle_gen.SAMPLE_RATE
+GAP = subtitle_gen.SCENE_GAP
+
+
+class FakeModel:
+    """Stands in for WhisperModel: returns one segment holding the given (word, start, end) tuples."""
+
+    def __init__(self, words):
+        self.words = [SimpleNamespace(word=w, start=s, end=e) for w, s, e in words]
+
+    def transcribe(self, audio, **kwargs):
+        return [SimpleNamespace(words=self.words)], None
+
+
+class FakePool:
+    def __init__(self, model):
+        self.model = model
+
+    @contextmanager
+    def acquire(self):
+        yield self.model
+
+
+@pytest.fixture
+def clips(tmp_path, monkeypatch):
+    """Writes placeholder audio files; decode_audio returns `seconds` of silence or raises for 'bad'."""
+    lengths = {}
+
+    def fake_decode(path, sampling_rate):
+        if lengths[path] is None:
+            raise ValueError("invalid data found when processing input")
+        return np.zeros(int(lengths[path] * sampling_rate), dtype=np.float32)
+
+    def make(*seconds):
+        paths = []
+        for i, length in enumerate(seconds):
+            path = str(tmp_path / f"audio_{i}.mp3")
+            with open(path, "wb") as f:
+                f.write(b"\0")
+            lengths[path] = length
+            paths.append(path)
+        return paths
+
+    monkeypatch.setattr(subtitle_gen, "decode_audio", fake_decode)
+    monkeypatch.setattr(subtitle_gen, "BatchedInferencePipeline", None)
+    return make
+
+
+def generator(words):
+    sub_gen = subtitle_gen.SubtitleGenerator()
+    sub_gen.pool = FakePool(FakeModel(words))
+    return sub_gen
+
+
+def test_words_are_split_back_per_scene(clips):
+    paths = clips(2.0, 3.0)
+    second = 2.0 + GAP
+    sub_gen = generator([("hello", 0.2, 0.6), ("there", 1.0, 1.5), ("world", second + 0.5, second + 1.0)])
+
+    results = sub_gen.generate_subtitles_batch(paths)
+
+    assert [w['word'] for w in results[0]] == ["hello", "there"]
+    assert results[1] == [{"word": "world", "start": pytest.approx(0.5), "end": pytest.approx(1.0)}]
+
+
+def test_undecodable_file_is_skipped(clips):
+    paths = clips(2.0, None, 1.0)
+    # The bad clip takes no room in the joined timeline, so the third scene follows the first
+    third = 2.0 + GAP
+    sub_gen = generator([("one", 0.1, 0.5), ("three", third + 0.1, third + 0.4)])
+
+    results = sub_gen.generate_subtitles_batch(paths)
+
+    assert [w['word'] for w in results[0]] == ["one"]
+    assert results[1] == []
+    assert [w['word'] for w in results[2]] == ["three"]
+
+
+def test_words_in_the_gap_never_end_before_they_start(clips):
+    paths = clips(1.0, 1.0)
+    sub_gen = generator([
+        ("tail", 0.7, 1.2),           # Runs into the gap; clipped to the scene end
+        ("noise", 1.3, 1.7),          # Entirely inside the gap
+        ("next", 1.0 + GAP, 1.5 + GAP),
+    ])
+
+    results = sub_gen.generate_subtitles_batch(paths)
+
+    assert [w['word'] for w in results[0]] == ["tail"]
+    assert [w['word'] for w in results[1]] == ["next"]
+    for words in results:
+        for w in words:
+            assert 0.0 <= w['start'] <= w['end']
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import pytest
+
+# Ensure we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+np = pytest.importorskip("numpy")
+subtitle_renderer = pytest.importorskip("src.subtitle_renderer")
+
+
+class SolidCache:
+    """Stands in for GlyphCache: every word is an opaque white box of the given size."""
+
+    def __init__(self, width=4, height=2):
+        self.shape = (height, width, 4)
+        self.rendered = []
+
+    def render(self, word, font, size, color, stroke_color, stroke_width):
+        self.rendered.append(word)
+        return np.full(self.shape, 255, dtype=np.uint8)
+
+
+WORDS = [
+    {'word': " second", 'start': 1.0, 'end': 1.5},
+    {'word': " first", 'start': 0.2, 'end': 0.8},
+    {'word': " ", 'start': 2.0, 'end': 2.5},        # Blank: dropped
+    {'word': " backwards", 'start': 3.0, 'end': 2.9}, # Ends before it starts: dropped
+    {'word': " first", 'start': 4.0, 'end': 4.5},
+]
+
+
+def overlay(cache=None, frame_size=(10, 6)):
+    return subtitle_renderer.SubtitleOverlay(WORDS, frame_size, "Arial", cache=cache or SolidCache())
+
+
+@pytest.mark.parametrize("t, word_idx", [
+    (0.0, None),  # Before the first word
+    (0.2, 0),     # Start is inclusive
+    (0.79, 0),
+    (0.8, None),  # End is exclusive
+    (0.9, None),  # Gap between words
+    (1.2, 1),
+    (2.2, None),  # Blank word was dropped
+    (4.1, 2),
+    (9.0, None),  # After the last word
+])
+def test_active_word_follows_the_timeline(t, word_idx):
+    assert overlay().active_index(t) == word_idx
+
+
+def test_each_unique_word_is_rendered_once():
+    cache = SolidCache()
+    overlay(cache)
+
+    assert sorted(cache.rendered) == ["first", "second"]
+
+
+def test_apply_blends_the_word_centered_without_touching_the_input():
+    frame = np.zeros((6, 10, 3), dtype=np.uint8)
+
+    out = overlay().apply(frame, 0.5)
+
+    assert not frame.any()
+    assert (out[2:4, 3:7] == 255).all()
+    out[2:4, 3:7] = 0
+    assert not out.any()
+
+
+def test_frames_without_an_active_word_pass_through():
+    frame = np.zeros((6, 10, 3), dtype=np.uint8)
+
+    assert overlay().apply(frame, 0.9) is frame
+
+
+def test_sprites_larger_than_the_frame_are_clipped():
+    frame = np.zeros((6, 10, 3), dtype=np.uint8)
+
+    out = overlay(SolidCache(width=14, height=8)).apply(frame, 0.5)
+
+    assert (out == 255).all()
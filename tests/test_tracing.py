@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import asyncio
+
+import pytest
+
+# Ensure we can import from src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import tracing
+from src.tracing import Tracer
+
+
+@pytest.fixture
+def tracer(tmp_path, monkeypatch):
+    tracer = Tracer(path=str(tmp_path / "traces.jsonl"))
+    # traced() records through the module-level tracer
+    monkeypatch.setattr(tracing, "tracer", tracer)
+    return tracer
+
+
+def read_spans(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_estimate_is_the_median_per_unit_of_matching_spans(tracer):
+    tracer.record("create_shorts", 20, scenes=2, draft=False)   # 10 s/scene
+    tracer.record("create_shorts", 60, scenes=4, draft=False)   # 15 s/scene
+    tracer.record("create_shorts", 90, scenes=3, draft=False)   # 30 s/scene
+    tracer.record("create_shorts", 1, scenes=5, draft=True)     # drafts don't count
+    tracer.record("create_shorts", 99, scenes=1, draft=False, failed=True)
+    tracer.record("create_shorts", 99, scenes=1, draft=False, error="OSError")
+
+    assert tracer.estimate("create_shorts", units=2, unit_attr="scenes", draft=False, failed=None) == 30
+
+
+def test_estimate_falls_back_to_the_default_per_unit(tracer):
+    assert tracer.estimate("create_shorts", units=4, unit_attr="scenes", default=15) == 60
+    assert tracer.estimate("create_shorts") is None
+
+
+def test_history_is_reloaded_from_the_trace_file(tracer):
+    tracer.record("download_url", 2.0)
+    tracer.record("download_url", 4.0)
+
+    assert Tracer(path=tracer.path).estimate("download_url") == 3.0
+
+
+def test_trace_file_is_rotated_past_max_bytes(tmp_path):
+    tracer = Tracer(path=str(tmp_path / "traces.jsonl"), max_bytes=200)
+    for i in range(10):
+        tracer.record("download_url", i)
+
+    assert os.path.getsize(tracer.path) <= 200
+    rotated = read_spans(f"{tracer.path}.1")
+    assert rotated and len(rotated) + len(read_spans(tracer.path)) <= 10
+    # A restart still sees the history from before the rotation
+    assert Tracer(path=tracer.path).estimate("download_url") is not None
+
+
+def test_traced_function_annotates_and_fails_its_own_span(tracer):
+    @tracing.traced("create_shorts")
+    def create_shorts(scenes):
+        tracer.annotate(scenes=scenes, backend="ffmpeg")
+        tracer.fail(OSError("disk full"))
+        return None
+
+    create_shorts(3)
+
+    span = read_spans(tracer.path)[-1]
+    assert span['scenes'] == 3 and span['backend'] == "ffmpeg"
+    assert span['error'] == "OSError"
+    assert tracer.estimate("create_shorts") is None
+
+
+def test_traced_async_records_output_bytes(tracer, tmp_path):
+    output = tmp_path / "audio.mp3"
+
+    @tracing.traced("generate_audio", output_arg="filename", provider="edge")
+    async def generate(text, filename):
+        with open(filename, "w") as f:
+            f.write(text)
+
+    asyncio.run(generate("hello", str(output)))
+
+    span = read_spans(tracer.path)[-1]
+    assert span['bytes'] == 5 and span['provider'] == "edge"
+
+
+def test_annotate_outside_a_span_is_a_no_op(tracer):
+    tracer.annotate(scenes=1)
+    tracer.fail("HTTP 500")